@@ -1,64 +1,46 @@
-#!/usr/bin/env python
-# coding: utf-8
+from schemas import read_csv
+from timing import stage
 
-# In[ ]:
+# Bump whenever the cleaned output changes so cached results are not reused
+CLEANER_VERSION = 3
 
+YEAR_COLUMN = "Date - Year"
 
-import pandas as pd
-import numpy as np
+# CYP method columns and their yearly total in yearly_totals()
+TOTAL_COLUMNS = {
+    "SUM of CYP_Oral": "Yearly Oral total",
+    "SUM of CYP_Injection": "Yearly Injection total",
+    "SUM of CYP_Implanon": "Yearly Implanon total",
+    "SUM of CYP_IUD": "Yearly IUD total",
+    "SUM of CYP_Total": "Yearly total",
+}
 
-# Load the CSV file, skipping the first two rows and treating "NaN" as missing values
-df = pd.read_csv("CYP DASHBOARD updated 10_07_2023 - CYP_CSB(in).csv", skiprows=2, na_values="NaN")
+# Rows written per chunk when saving the cleaned data
+OUTPUT_CHUNK_ROWS = 50_000
 
-# Forward fill the 'Date - Year' column where there are NaN values to carry the last valid value forward
-df['Date - Year'] = df['Date - Year'].fillna(method='ffill')
 
-# Drop any rows that still contain NaN values after forward filling
-df = df.dropna()
+@stage("clean.cyp_csb")
+def cyp_csb_cleaning(input_file, output_file=None):
+    # Load the CSV file in its declared types, skipping the first two rows
+    df = read_csv(input_file, "cyp_csb")
 
-# Group the data by 'Date - Year' and sum the 'SUM of CYP_Oral' values for each year
-oral_totals = df.groupby("Date - Year")["SUM of CYP_Oral"].sum().reset_index()
-# Rename the 'SUM of CYP_Oral' column to 'Yearly Oral total' for clarity
-oral_totals.rename(columns={"SUM of CYP_Oral": "Yearly Oral total"}, inplace=True)
+    # Forward fill the 'Date - Year' column where there are NaN values to carry the last valid value forward
+    df[YEAR_COLUMN] = df[YEAR_COLUMN].ffill()
 
-# Merge the yearly oral totals back into the original DataFrame
-df = pd.merge(df, oral_totals, on="Date - Year")
+    # Drop any rows that still contain NaN values after forward filling
+    df = df.dropna().reset_index(drop=True)
 
-# For rows with duplicate 'Date - Year' values (except the first occurrence), set 'Yearly Oral total' to NaN
-df.loc[df.duplicated(subset=['Date - Year']), 'Yearly Oral total'] = np.nan
+    if output_file is not None:
+        df.to_csv(output_file, index=False, chunksize=OUTPUT_CHUNK_ROWS)
 
-# Repeat the same process for 'SUM of CYP_Injection'
-injection_totals = df.groupby("Date - Year")["SUM of CYP_Injection"].sum().reset_index()
-injection_totals.rename(columns={"SUM of CYP_Injection": "Yearly Injection total"}, inplace=True)
-df = pd.merge(df, injection_totals, on="Date - Year")
-df.loc[df.duplicated(subset=['Date - Year']), 'Yearly Injection total'] = np.nan
+    return df
 
-# Repeat the same process for 'SUM of CYP_Implanon'
-implanon_totals = df.groupby("Date - Year")["SUM of CYP_Implanon"].sum().reset_index()
-implanon_totals.rename(columns={"SUM of CYP_Implanon": "Yearly Implanon total"}, inplace=True)
-df = pd.merge(df, implanon_totals, on="Date - Year")
-df.loc[df.duplicated(subset=['Date - Year']), 'Yearly Implanon total'] = np.nan
 
-# Repeat the same process for 'SUM of CYP_IUD'
-iud_totals = df.groupby("Date - Year")["SUM of CYP_IUD"].sum().reset_index()
-iud_totals.rename(columns={"SUM of CYP_IUD": "Yearly IUD total"}, inplace=True)
-df = pd.merge(df, iud_totals, on="Date - Year")
-df.loc[df.duplicated(subset=['Date - Year']), 'Yearly IUD total'] = np.nan
+def yearly_totals(df):
+    # Every CYP method summed per year of the cleaned rows in a single groupby, one row per year
+    return df.groupby(YEAR_COLUMN)[list(TOTAL_COLUMNS)].sum().rename(columns=TOTAL_COLUMNS)
 
-# Group the data by 'Date - Year' and calculate the sum of 'SUM of CYP_Total' for each year
-yearly_totals = df.groupby("Date - Year")["SUM of CYP_Total"].sum().reset_index()
-# Rename the column 'SUM of CYP_Total' to 'Yearly total' for clarity
-yearly_totals.rename(columns={"SUM of CYP_Total": "Yearly total"}, inplace=True)
-
-# Merge the yearly totals back into the original DataFrame based on the 'Date - Year' column
-df = pd.merge(df, yearly_totals, on="Date - Year")
-
-# For rows with duplicate 'Date - Year' values (except the first occurrence), set 'Yearly total' to NaN
-df.loc[df.duplicated(subset=['Date - Year']), 'Yearly total'] = np.nan
-
-# Export the final DataFrame to a new CSV file
-df.to_csv("processed_CYP_data.csv", index=False)
-
-# Display the final DataFrame
-df
 
+if __name__ == "__main__":
+    cleaned = cyp_csb_cleaning("CYP DASHBOARD updated 10_07_2023 - CYP_CSB(in).csv", "processed_CYP_data.csv")
+    yearly_totals(cleaned).to_csv("processed_CYP_yearly_totals.csv")
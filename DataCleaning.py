@@ -1,25 +1,142 @@
+import functools
+from collections import namedtuple
 
 import pandas as pd
+import numpy as np
 import re
+
+from schemas import read_csv
+from timing import stage
+
+# Bump whenever the cleaned output changes so cached results are not reused
+CLEANER_VERSION = 3
+
+ID_COLUMNS = ["Indicator Level", "Indicator and Definition", "Overall Target", "Baseline Value"]
+
+# Number of leading rows searched for the header block
+HEADER_SCAN_ROWS = 15
+
+# Where the pieces of an IPTT sheet sit: the first data row, the positions of ID_COLUMNS and,
+# for every report year, (year label, target position, actual position)
+IpttLayout = namedtuple("IpttLayout", ["data_start", "id_positions", "years"])
+
+# Layout of the original three-year export, used when no Target/Actual header row is found
+LEGACY_LAYOUT = IpttLayout(3, (0, 1, 2, 3), (("2021-2022", 4, 5), ("2022-2023", 6, 7), ("2023-2024", 8, 9)))
+
+_TARGET_ACTUAL = re.compile(r"^(target|actual)\b", re.IGNORECASE)
+_FISCAL_YEAR = re.compile(r"(\d{4})\s*[-/]\s*(\d{2,4})")
+_YEAR_NUMBER = re.compile(r"\by(?:ear)?\s*(\d+)\b", re.IGNORECASE)
+_CALENDAR_YEAR = re.compile(r"\b(\d{4})\b")
+
+
+def reshape_iptt(wide, years):
+    # Turn the wide IPTT block (ID_COLUMNS plus a "Target <y>"/"Actual <y>" pair per year) into one row
+    # per indicator and year. Rows are year-major, matching the order of the old melt + merge.
+    n_rows = len(wide)
+    long = {col: np.tile(wide[col].to_numpy(dtype=object), len(years)) for col in ID_COLUMNS}
+    long["Year"] = np.repeat(np.array(years, dtype=object), n_rows)
+    # column-major ravel stacks the year columns one after the other in a single reshape
+    long["Target"] = wide[[f"Target {y}" for y in years]].to_numpy(dtype=object).ravel(order="F")
+    long["Actual"] = wide[[f"Actual {y}" for y in years]].to_numpy(dtype=object).ravel(order="F")
+    combined_dc = pd.DataFrame(long)
+
+    # the level is only written on the first indicator of each group, so fill it down
+    combined_dc["Indicator Level"] = combined_dc["Indicator Level"].ffill()
+    return combined_dc
+
+
+def _year_label(text, number):
+    # "2021-2022", "2021/22", "Year 1", "Y1" or "2023" -> report year label
+    match = _FISCAL_YEAR.search(text)
+    if match:
+        start, end = match.groups()
+        if len(end) == 2:
+            end = start[:2] + end
+        return f"{start}-{end}"
+    match = _YEAR_NUMBER.search(text)
+    if match:
+        number = int(match.group(1))
+    else:
+        match = _CALENDAR_YEAR.search(text)
+        if match:
+            return match.group(1)
+    # Y1 of the programme is fiscal year 2021-2022
+    return f"{2020 + number}-{2021 + number}"
+
+
+def _find_id_position(header_rows, keywords, taken):
+    # search from the row closest to the data upwards so the sheet title is only used as a last resort
+    for row in reversed(header_rows):
+        for pos, cell in enumerate(row):
+            if pos not in taken and any(keyword in cell.lower() for keyword in keywords):
+                return pos
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def detect_layout(header_rows):
+    # header_rows holds the cells of every row up to and including the Target/Actual row, so
+    # files exported with the same header share one cached layout whatever their data.
+    sub_header = header_rows[-1]
+
+    years = []
+    target_pos = None
+    for pos, cell in enumerate(sub_header):
+        match = _TARGET_ACTUAL.match(cell.strip())
+        if not match:
+            continue
+        if match.group(1).lower() == "target":
+            target_pos = pos
+        elif target_pos is not None:
+            # the year is written after the keyword or in a (merged) cell above the pair
+            text = cell.strip()[match.end():].strip() or _TARGET_ACTUAL.sub("", sub_header[target_pos].strip()).strip()
+            for row in reversed(header_rows[:-1]):
+                if text:
+                    break
+                text = row[target_pos].strip() or row[pos].strip()
+            years.append((_year_label(text, len(years) + 1), target_pos, pos))
+            target_pos = None
+
+    taken = {pos for _, target, actual in years for pos in (target, actual)}
+    id_positions = []
+    for keywords, default in ((("level",), 0), (("definition",), 1), (("overall",), 2), (("baseline",), 3)):
+        pos = _find_id_position(header_rows, keywords, taken)
+        if pos is None and keywords == ("definition",):
+            pos = _find_id_position(header_rows[1:], ("indicator",), taken)
+        pos = default if pos is None else pos
+        taken.add(pos)
+        id_positions.append(pos)
+
+    return IpttLayout(len(header_rows), tuple(id_positions), tuple(years))
+
+
+def find_layout(raw):
+    # single pass over the leading rows to find the Target/Actual header row
+    head = raw.head(HEADER_SCAN_ROWS).fillna("")
+    for i, row in enumerate(head.itertuples(index=False, name=None)):
+        cells = [cell.strip() for cell in row]
+        kinds = {m.group(1).lower() for m in map(_TARGET_ACTUAL.match, cells) if m}
+        if kinds == {"target", "actual"}:
+            header_rows = tuple(tuple(r) for r in head.iloc[:i + 1].itertuples(index=False, name=None))
+            layout = detect_layout(header_rows)
+            if layout.years:
+                return layout
+    return LEGACY_LAYOUT
+
+
+@stage("clean.iptt")
 def data_cleaning(input_file):
-    df = pd.read_csv(input_file, dtype=str)
-    print("hello")
-    df = df.applymap(lambda x: x.replace('%', '') if isinstance(x, str) else x)
-    columns = [ "Indicator Performance Tracking Table (IPTT)","Unnamed: 1","Unnamed: 2","Unnamed: 3","Unnamed: 4","Unnamed: 5","Unnamed: 6","Unnamed: 7","Unnamed: 8","Unnamed: 9"]
-    names = ["Indicator Level","Indicator and Definition","Overall Target","Baseline Value","Target Y1","Actual Y1","Target Y2","Actual Y2", "Target Y3","Actual Y3"]
-    dc = pd.DataFrame()
-    for i in range(len(columns)):
-        value = df.loc[2:23, columns[i]]
-        dc[names[i]] = value
-    melted_target = pd.melt(dc, id_vars=["Indicator Level","Indicator and Definition","Overall Target","Baseline Value"], value_vars=["Target Y1", "Target Y2","Target Y3"], var_name='Year', value_name='Target')
-    target = melted_target['Target']
-    melted_actual =  pd.melt(dc, id_vars=["Indicator Level","Indicator and Definition","Overall Target","Baseline Value"], value_vars=["Actual Y1", "Actual Y2","Actual Y3"], var_name='Year', value_name='Actual')
-    combined_dc = pd.merge(melted_target, melted_actual, on=["Indicator Level","Indicator and Definition","Overall Target","Baseline Value","Year"], how="right")
-    combined_dc['Target'] = target
-    combined_dc.replace({'Actual Y1': '2021-2022', 'Actual Y2': '2022-2023', 'Actual Y3': '2023-2024'}, inplace=True)
-
-    for i in range(1, len(combined_dc['Indicator Level'])):
-        if pd.isna(combined_dc.loc[i, 'Indicator Level']):
-            combined_dc.loc[i, 'Indicator Level'] = combined_dc.loc[i - 1, 'Indicator Level']
-
-    return combined_dc
\ No newline at end of file
+    raw = read_csv(input_file, "iptt")
+    layout = find_layout(raw)
+
+    labels = [label for label, _, _ in layout.years]
+    positions = list(layout.id_positions) + [pos for _, target, actual in layout.years for pos in (target, actual)]
+    names = ID_COLUMNS + [f"{kind} {y}" for y in labels for kind in ("Target", "Actual")]
+
+    # strip percent signs one column at a time with vectorized string ops
+    block = raw.iloc[layout.data_start:]
+    dc = pd.DataFrame({name: block[pos].str.replace('%', '', regex=False) for pos, name in zip(positions, names)})
+
+    # drop blank rows and trailing notes, which carry neither an indicator nor any values
+    dc = dc.dropna(how="all", subset=names[1:])
+    return reshape_iptt(dc, labels)
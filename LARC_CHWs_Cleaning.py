@@ -1,66 +1,97 @@
 import pandas as pd
 import numpy as np
 import re
-
-def larc_chw_cleaning(input_file):
-    # Load the CSV file, skipping the first two rows and treating "NaN" as NaN values
-    df = pd.read_csv(input_file, skiprows=2, na_values="NaN")
-
-    # Function to clean and split the "Quarter" column into "Year" and "Quarter"
-    def clean_quarter_column(quarter_str):
-        if pd.isna(quarter_str):
-            return np.nan, np.nan
-        # Define regex patterns to capture various formats
-        patterns = [
-            r"(?P<Year>\d{4})[-/\s]*(?P<Quarter>Q[1-4])",  # Matches "2023-Q1", "2023/Q1", "2023 Q1"
-            r"(?P<Quarter>Q[1-4])[-/\s]*(?P<Year>\d{4})",  # Matches "Q1-2023", "Q1/2023", "Q1 2023"
-            r"(?P<Year>\d{4})[-/\s]*(?P<Month>[A-Za-z]+)",  # Matches "2023-Jan", "2023 January"
-        ]
-        for pattern in patterns:
-            match = re.match(pattern, quarter_str)
-            if match:
-                match_dict = match.groupdict()
-                # If we matched a month instead of a quarter, map months to quarters
-                if 'Month' in match_dict:
-                    month = match_dict['Month'].lower()[:3]  # Get first three letters, lowercase
-                    month_to_quarter = {
-                        'jan': 'Q1', 'feb': 'Q1', 'mar': 'Q1',
-                        'apr': 'Q2', 'may': 'Q2', 'jun': 'Q2',
-                        'jul': 'Q3', 'aug': 'Q3', 'sep': 'Q3',
-                        'oct': 'Q4', 'nov': 'Q4', 'dec': 'Q4'
-                    }
-                    match_dict['Quarter'] = month_to_quarter.get(month, np.nan)
-                    match_dict.pop('Month')  # Remove 'Month' from dict
-                return match_dict.get('Year'), match_dict.get('Quarter')
-        return np.nan, np.nan
-
-    # Apply the cleaning function to split the "Quarter" column
-    df['Year'], df['Quarter'] = zip(*df['Quarter'].apply(clean_quarter_column))
+import threading
+
+from schemas import read_csv
+from timing import stage
+
+# Bump whenever the cleaned output changes so cached results are not reused
+CLEANER_VERSION = 5
+
+# One alternation tried in the same order as the formats below, compiled once at import
+PERIOD_PATTERN = re.compile(
+    r"^(?:(?P<year_q>\d{4})[-/\s]*(?P<quarter_y>Q[1-4])"  # Matches "2023-Q1", "2023/Q1", "2023 Q1"
+    r"|(?P<quarter>Q[1-4])[-/\s]*(?P<year>\d{4})"  # Matches "Q1-2023", "Q1/2023", "Q1 2023"
+    r"|(?P<year_m>\d{4})[-/\s]*(?P<month>[A-Za-z]+))"  # Matches "2023-Jan", "2023 January"
+)
+
+MONTH_TO_QUARTER = {
+    'jan': 'Q1', 'feb': 'Q1', 'mar': 'Q1',
+    'apr': 'Q2', 'may': 'Q2', 'jun': 'Q2',
+    'jul': 'Q3', 'aug': 'Q3', 'sep': 'Q3',
+    'oct': 'Q4', 'nov': 'Q4', 'dec': 'Q4'
+}
+
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+
+# Parsed (year, quarter) for every period string seen so far; exports only use a handful of them.
+# Shared by every session's cleaning, so it is only read and written under its lock.
+_period_cache = {}
+_period_lock = threading.Lock()
+_PERIOD_CACHE_SIZE = 100_000
+
+
+def _parse_new_periods(periods):
+    parts = pd.Series(periods, dtype=object).str.extract(PERIOD_PATTERN)
+    year = parts["year_q"].fillna(parts["year"]).fillna(parts["year_m"])
+    # If we matched a month instead of a quarter, map months to quarters
+    month_quarter = parts["month"].str[:3].str.lower().map(MONTH_TO_QUARTER)
+    quarter = parts["quarter_y"].fillna(parts["quarter"]).fillna(month_quarter)
+    return {period: (int(y) if isinstance(y, str) else None, q if isinstance(q, str) else None)
+            for period, y, q in zip(periods, year, quarter)}
+
+
+def split_periods(periods):
+    # Split period strings into categorical "Year" and "Quarter" columns, parsing each distinct string once
+    codes, uniques = pd.factorize(periods)
+    with _period_lock:
+        known = {period: _period_cache[period] for period in uniques if period in _period_cache}
+    new = [period for period in uniques if period not in known]
+    if new:
+        # parsed outside the lock into a local mapping, then merged into the shared cache
+        known.update(_parse_new_periods(new))
+        with _period_lock:
+            if len(_period_cache) + len(new) > _PERIOD_CACHE_SIZE:
+                _period_cache.clear()
+            _period_cache.update((period, known[period]) for period in new)
+    parsed = [known[period] for period in uniques]
+
+    years = sorted({y for y, _ in parsed if y is not None})
+    year_index = {y: i for i, y in enumerate(years)}
+    # the trailing -1 is picked up by the -1 code pandas gives missing periods
+    year_codes = np.array([year_index.get(y, -1) for y, _ in parsed] + [-1])
+    quarter_codes = np.array([QUARTERS.index(q) if q in QUARTERS else -1 for _, q in parsed] + [-1])
+
+    year = pd.Categorical.from_codes(year_codes[codes], categories=years, ordered=True)
+    quarter = pd.Categorical.from_codes(quarter_codes[codes], categories=QUARTERS, ordered=True)
+    return year, quarter
+
+
+@stage("clean.larc")
+def larc_chw_cleaning(input_file, output_file=None):
+    # Load the CSV file in its declared types, skipping the first two rows
+    df = read_csv(input_file, "larc")
+
+    # Split the "Quarter" column into categorical "Year" and "Quarter"
+    df['Year'], df['Quarter'] = split_periods(df['Quarter'])
 
     # Drop rows with any NaN values after splitting
     df = df.dropna(subset=['Year', 'Quarter', 'CYP total'])
 
-    # Group the data by "Year" and calculate the sum of "CYP total" for each year
-    yearly_totals = df.groupby('Year')['CYP total'].sum().reset_index()
-
-    # Rename the column "CYP total" to "Yearly total" in the yearly totals DataFrame
-    yearly_totals.rename(columns={'CYP total': 'Yearly total'}, inplace=True)
-
-    # Merge the yearly totals back into the original DataFrame based on the "Year" column
-    df = pd.merge(df, yearly_totals, on='Year')
-
-    # For rows with duplicate "Year" values (except the first occurrence), set "Yearly total" to NaN
-    df.loc[df.duplicated(subset=['Year'], keep='first'), 'Yearly total'] = np.nan
-
     # Optionally reset the index for cleanliness
     df.reset_index(drop=True, inplace=True)
 
-    # After processing, save the DataFrame to a CSV file
-    output_file = "cleaned_data.csv"  # Save to a temporary directory or any other desired location
-    df.to_csv(output_file, index=False)
+    # Optionally export the cleaned data, e.g. to a per-session location
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
+
+    return df
+
 
-    # Return the path to the saved CSV file
-    return output_file
+def yearly_totals(df):
+    # Total CYP per year of the cleaned rows, one row per year; join on "Year" where rows need it
+    return df.groupby('Year', observed=True)[['CYP total']].sum().rename(columns={'CYP total': 'Yearly total'})
 
 
 
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+from timing import stage
+
+STATS = ["count", "sum", "mean", "min", "max"]
+
+# Cubes are small (one row per year), so a fixed number of them is kept
+MAX_CUBES = 64
+
+_lock = threading.Lock()
+_cubes = OrderedDict()
+
+
+def build_cube(df, by, metrics):
+    # One groupby for every metric: rows are the values of `by`, columns are (metric, stat)
+    return df.groupby(by, observed=True, sort=True)[list(metrics)].agg(STATS)
+
+
+def get_cube(key, df, by, metrics, prepare=None):
+    # Cube for a dataset, built once per key. `prepare` turns the cleaned frame into the one the
+    # page aggregates (e.g. percent strings to floats) and only runs when the cube is built.
+    cube_id = (key, by, tuple(metrics))
+    with _lock:
+        cube = _cubes.get(cube_id)
+        if cube is not None:
+            _cubes.move_to_end(cube_id)
+            return cube
+    if prepare is not None:
+        with stage("prepare"):
+            df = prepare(df)
+    with stage("aggregates"):
+        cube = build_cube(df, by, metrics)
+    with _lock:
+        _cubes[cube_id] = cube
+        while len(_cubes) > MAX_CUBES:
+            _cubes.popitem(last=False)
+    return cube
+
+
+def update_cube(cube, df, by, metrics, prepare=None):
+    # Cube with the rows of the values of `by` found in df rebuilt from df, which must hold every row
+    # of those values (e.g. all rows of the years an append touched); the other rows are kept
+    import pandas as pd
+    if prepare is not None:
+        df = prepare(df)
+    with stage("aggregates"):
+        rebuilt = build_cube(df, by, metrics)
+    kept = cube[~cube.index.isin(rebuilt.index)]
+    return (pd.concat([kept, rebuilt]) if len(kept) else rebuilt).sort_index()
+
+
+def yearly_frame(cube, columns, years):
+    # Per-year values for charts: columns maps a plot column name to (metric, stat); rows sorted by year
+    import pandas as pd
+    frame = pd.DataFrame({"Years": sorted(years)})
+    for name, (metric, stat) in columns.items():
+        frame[name] = cube[(metric, stat)].reindex(frame["Years"]).to_numpy()
+    return frame
@@ -0,0 +1,69 @@
+# End-to-end benchmark of the IPTT parse in DataCleaning.data_cleaning (layout detection, CSV read and
+# reshape) on generated IPTT files, against the data_cleaning of another commit. Run from the repository
+# root:
+#   python benchmarks/bench_iptt.py --rows 1000 10000 100000 [--baseline REV]
+# The baseline defaults to the repository's first commit. Its parser always reshapes the fixed rows 2-23
+# of the legacy layout, so on larger files it only pays for reading and stripping the whole file.
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import DataCleaning
+from generators import iptt
+
+
+def load_revision(rev):
+    # DataCleaning as it was at a commit, imported under another name
+    source = subprocess.run(["git", "show", f"{rev}:DataCleaning.py"], cwd=REPO, capture_output=True, text=True,
+                            check=True).stdout
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("DataCleaning_baseline", f.name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    os.remove(f.name)
+    return module
+
+
+def best_of(clean, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        # the layout of a header is memoized; every run detects it again, as for a new upload
+        DataCleaning.detect_layout.cache_clear()
+        start = time.perf_counter()
+        # the baseline parser prints while it runs
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = clean(io.BytesIO(data))
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", nargs="+", type=int, default=[22, 1_000, 10_000, 100_000],
+                        help="indicators per generated file")
+    parser.add_argument("--baseline", help="commit to compare against (default: the first commit)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline_rev = args.baseline or subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=REPO,
+                                                   capture_output=True, text=True).stdout.split()[0]
+    baseline = load_revision(baseline_rev)
+    print(f"{'indicators':>10} {'bytes':>10} {'rows out':>9} {'seconds':>9} "
+          f"{baseline_rev[:7] + ' rows':>12} {baseline_rev[:7] + ' s':>10} {'speedup':>8}")
+    for rows in args.rows:
+        data = iptt(rows)
+        seconds, out = best_of(DataCleaning.data_cleaning, data, args.repeat)
+        base_seconds, base_out = best_of(baseline.data_cleaning, data, args.repeat)
+        print(f"{rows:>10} {len(data):>10} {out:>9} {seconds:>9.4f} {base_out:>12} {base_seconds:>10.4f} "
+              f"{base_seconds / seconds:>8.2f}")
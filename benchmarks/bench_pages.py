@@ -0,0 +1,185 @@
+# Cleaning and page rendering benchmark on synthetic uploads, reported as JSON to compare commits.
+# Run from the repository root:
+#   python benchmarks/bench_pages.py --rows 1000 10000 100000 --output bench.json
+#   python benchmarks/bench_pages.py --compare before.json after.json
+# Each dataset and size runs in its own process, so peak RSS is that case's alone.
+import argparse
+import importlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# dataset -> (cleaner as "module:function" or None, pages reading that upload)
+CASES = {
+    "iptt": ("DataCleaning:data_cleaning", ["indicator_perf.py"]),
+    "larc": ("LARC_CHWs_Cleaning:larc_chw_cleaning", ["year_cyp.py"]),
+    "cyp_csb": ("CYP_CSB_Cleaning:cyp_csb_cleaning", []),
+    "impact": ("impact_cleaning:ImpactFormat", ["year_child.py", "impact_outcome_overview.py"]),
+    "outcomes": ("outcome_cleaning:OutcomesSave", ["year_disease.py"]),
+    # the CHW cleaner lives in its page, so it is timed by the page's first run
+    "chw": (None, ["chw_activity.py"]),
+}
+
+# Runs a page with every file uploader returning the benchmark file
+PAGE_SCRIPT = '''
+import io
+import sys
+import streamlit as st
+sys.path.insert(0, {repo!r})
+
+
+def upload(*args, accept_multiple_files=False, **kwargs):
+    with open({path!r}, "rb") as f:
+        uploaded = io.BytesIO(f.read())
+    uploaded.name = {name!r}
+    uploaded.file_id = {path!r}
+    uploaded.size = len(uploaded.getvalue())
+    return [uploaded] if accept_multiple_files else uploaded
+
+
+st.file_uploader = upload
+st.sidebar.file_uploader = upload
+exec(compile(open({page!r}).read(), {page!r}, "exec"), {{"__name__": "__main__"}})
+'''
+
+
+def latency(seconds):
+    seconds = np.array(seconds)
+    return {"runs": len(seconds), "p50": float(np.percentile(seconds, 50)),
+            "p95": float(np.percentile(seconds, 95)), "min": float(seconds.min())}
+
+
+def bench_cleaner(cleaner, data, rows, repeat):
+    module, function = cleaner.split(":")
+    clean = getattr(importlib.import_module(module), function)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        clean(io.BytesIO(data))
+        seconds.append(time.perf_counter() - start)
+    result = latency(seconds)
+    result["rows_per_second"] = rows / result["p50"]
+    return result
+
+
+def bench_page(page, path, repeat, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    script = PAGE_SCRIPT.format(repo=REPO, path=path, name=os.path.basename(path),
+                                page=os.path.join(REPO, "pages", page))
+    app = AppTest.from_string(script, default_timeout=timeout)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    errors = [str(e.value) for e in app.exception]
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app.run()
+        warm.append(time.perf_counter() - start)
+        errors += [str(e.value) for e in app.exception]
+    return {"cold_seconds": cold, "warm": latency(warm), "errors": errors}
+
+
+def run_case(dataset, rows, seed, repeat, timeout):
+    sys.path.insert(0, REPO)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from generators import GENERATORS
+
+    cleaner, pages = CASES[dataset]
+    start = time.perf_counter()
+    data = GENERATORS[dataset](rows, seed)
+    result = {"dataset": dataset, "rows": rows, "seed": seed, "bytes": len(data),
+              "generate_seconds": time.perf_counter() - start}
+    if cleaner is not None:
+        result["clean"] = bench_cleaner(cleaner, data, rows, repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"{dataset}.csv")
+        with open(path, "wb") as f:
+            f.write(data)
+        del data
+        result["pages"] = {page: bench_page(page, path, repeat, timeout) for page in pages}
+    # kilobytes on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_all(datasets, sizes, seed, repeat, timeout):
+    results = []
+    for rows in sizes:
+        for dataset in datasets:
+            # caches and the Parquet store start empty for every case
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, BV_STORE_DIR=os.path.join(tmp, "store"),
+                           BV_CACHE_DIR=os.path.join(tmp, "spill"), BV_TIMING_LOG="", BV_LOG_FILE="")
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--case", dataset, "--rows", str(rows),
+                     "--seed", str(seed), "--repeat", str(repeat), "--timeout", str(timeout)],
+                    env=env, cwd=tmp, capture_output=True, text=True)
+            if child.returncode != 0:
+                results.append({"dataset": dataset, "rows": rows, "failed": child.stderr[-2000:]})
+            else:
+                results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+            print(f"{dataset:>9} {rows:>10}", "failed" if child.returncode else "done", file=sys.stderr)
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True)
+    return {"commit": commit.stdout.strip(), "python": sys.version.split()[0], "results": results}
+
+
+def _medians(report):
+    # (dataset, rows, stage) -> p50 seconds
+    medians = {}
+    for result in report["results"]:
+        key = (result["dataset"], result["rows"])
+        if "clean" in result:
+            medians[key + ("clean",)] = result["clean"]["p50"]
+        for page, timings in result.get("pages", {}).items():
+            medians[key + (f"{page} cold",)] = timings["cold_seconds"]
+            medians[key + (f"{page} warm",)] = timings["warm"]["p50"]
+    return medians
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    old, new = _medians(before), _medians(after)
+    print(f"{'dataset':>9} {'rows':>10} {'stage':<36} {before['commit']:>10} {after['commit']:>10} {'ratio':>7}")
+    for key in sorted(old.keys() & new.keys()):
+        dataset, rows, name = key
+        print(f"{dataset:>9} {rows:>10} {name:<36} {old[key]:>10.4f} {new[key]:>10.4f} {new[key] / old[key]:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--rows", nargs="+", type=int, default=[1_000, 10_000, 100_000],
+                        help="sizes to run, up to 10_000_000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per cleaner and warm page")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed for one page run")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--case", choices=list(CASES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.case:
+        print(json.dumps(run_case(args.case, args.rows[0], args.seed, args.repeat, args.timeout)))
+    else:
+        report = run_all(args.datasets, args.rows, args.seed, args.repeat, args.timeout)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
@@ -0,0 +1,171 @@
+# Seeded synthetic uploads in the layout each cleaner reads, from a few rows to tens of millions.
+# Every generator returns the CSV as bytes; the same (rows, seed) always gives the same file.
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+YEARS = [2021, 2022, 2023, 2024]
+
+
+def site_names(count, seed=0):
+    fake = Faker()
+    fake.seed_instance(seed)
+    names = []
+    while len(names) < count:
+        name = fake.city()
+        if name not in names:
+            names.append(name)
+    return np.array(names, dtype=object)
+
+
+def _sites(rng, rows, seed, count=50):
+    return site_names(min(count, max(rows, 1)), seed)[rng.integers(0, min(count, max(rows, 1)), rows)]
+
+
+def _percent(values, decimals=1):
+    return np.char.add(np.char.mod(f"%.{decimals}f", values), "%")
+
+
+def _to_csv(df, title_rows=()):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(title_rows)
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def iptt(rows, seed=0):
+    # Indicator Performance Tracking Table: a title, a year row over Target/Actual pairs and one
+    # row per indicator with percent and plain values mixed
+    rng = np.random.default_rng(seed)
+    levels = np.full(rows, "", dtype=object)
+    for i, level in enumerate(["Impacts", "Outcomes", "Outputs"]):
+        levels[rows * i // 3] = level
+    columns = {
+        0: levels,
+        1: np.char.add("Indicator ", np.arange(rows).astype(str)),
+        2: _percent(rng.integers(50, 100, rows), 0),
+        3: rng.integers(1, 40, rows).astype(str),
+    }
+    for i in range(6):
+        values = rng.integers(1, 100, rows)
+        columns[4 + i] = _percent(values, 0) if i % 3 else values.astype(str)
+    header = [["Indicator Performance Tracking Table (IPTT)"] + [""] * 9,
+              ["Indicator Level", "Indicator and Definition", "Overall Target", "Baseline Value",
+               "Year 1 (2021-2022)", "", "Year 2 (2022-2023)", "", "Year 3 (2023-2024)", ""],
+              ["", "", "", "", "Target", "Actual", "Target", "Actual", "Target", "Actual"]]
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(header)
+    pd.DataFrame(columns).to_csv(buffer, index=False, header=False)
+    return buffer.getvalue().encode()
+
+
+def larc(rows, seed=0):
+    # LARC sheet: two title rows, then one row per site and quarter in the period spellings seen in uploads
+    rng = np.random.default_rng(seed)
+    formats = ["{y}-Q{q}", "{y} Q{q}", "Q{q}-{y}", "Q{q}/{y}"]
+    quarters = np.array([f.format(y=y, q=q) for f in formats for y in YEARS for q in range(1, 5)], dtype=object)
+    methods = rng.random((rows, 4)).round(2) * 10
+    return _to_csv(pd.DataFrame({
+        "Site": _sites(rng, rows, seed),
+        "Quarter": quarters[rng.integers(0, len(quarters), rows)],
+        "CYP pills": methods[:, 0],
+        "CYP injection": methods[:, 1],
+        "CYP Implant": methods[:, 2],
+        "CYP IUD": methods[:, 3],
+        "CYP total": methods.sum(axis=1).round(2),
+    }), [["LARC report"], [""]])
+
+
+def cyp_csb(rows, seed=0):
+    # CYP per CSB: the year is only written on the first row of each year's block
+    rng = np.random.default_rng(seed)
+    years = np.array(YEARS)[np.arange(rows) * len(YEARS) // max(rows, 1)]
+    first = np.r_[True, years[1:] != years[:-1]]
+    methods = rng.random((rows, 4)).round(2) * 10
+    return _to_csv(pd.DataFrame({
+        "Date - Year": np.where(first, years.astype(str), ""),
+        "CSB": np.char.add("CSB ", (np.arange(rows) % 40).astype(str)),
+        "SUM of CYP_Oral": methods[:, 0],
+        "SUM of CYP_Injection": methods[:, 1],
+        "SUM of CYP_Implanon": methods[:, 2],
+        "SUM of CYP_IUD": methods[:, 3],
+        "SUM of CYP_Total": methods.sum(axis=1).round(2),
+    }), [["CYP CSB"], [""]])
+
+
+def impact(rows, seed=0):
+    # Impact sheet: HIV prevalence mixes "1.2%" texts and fractions, retention in care is a fraction
+    # with gaps
+    rng = np.random.default_rng(seed)
+    hiv = rng.random(rows) * 5
+    retained = rng.random(rows).round(3)
+    retained[::4] = np.nan
+    return _to_csv(pd.DataFrame({
+        "Years": np.array(YEARS)[rng.integers(0, len(YEARS), rows)],
+        "Site": _sites(rng, rows, seed),
+        "Population": rng.integers(1000, 5000, rows),
+        "Children under five": rng.integers(100, 500, rows),
+        "Women of Reproductive Age (FAR) 15 - 49 years old": rng.integers(100, 900, rows),
+        "Child mortality rate (children under 5 years)\nCHWs+CSB": _percent(rng.random(rows) * 10),
+        "Number of child deaths (absolute number)\nCHWs+CSB": rng.integers(0, 20, rows),
+        "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only":
+            np.where(np.arange(rows) % 3 == 0, (hiv / 100).round(4).astype(str), _percent(hiv)),
+        "Proportion of women giving birth under a skilled attendant\nCSB only": _percent(rng.random(rows) * 100),
+        "Proportion of women retained in care (HIV treatment)": retained,
+        "Number of Service Delivery points added/strengthened(Children under five and mother)":
+            rng.integers(0, 5, rows),
+    }))
+
+
+def outcomes(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return _to_csv(pd.DataFrame({
+        "Years": np.array(YEARS)[rng.integers(0, len(YEARS), rows)],
+        "Site": _sites(rng, rows, seed),
+        "Couple Years Protection (CYP)AC": rng.random(rows) * 100,
+        "Couple Years Protection (CYP)AC+LARC": rng.random(rows) * 100,
+        "Couple Years Protection (CYP)CSB": rng.random(rows) * 100,
+        "Proportion Neonatal Death ( 0-28 days) in local health system (CSB+Villages) level":
+            _percent(rng.random(rows) * 10),
+        "Proportion of children under five years receiving appropriate treatment for diarrhea":
+            _percent(rng.random(rows) * 100),
+        "Proportion of children under five years receiving appropriate treatment for malaria":
+            _percent(rng.random(rows) * 100),
+        "Proportion of children under five years receiving appropriate treatment for pneumonia":
+            _percent(rng.random(rows) * 100),
+        "Number of Population reached with improved access to health services": rng.integers(100, 1000, rows),
+        "Number of Villages reached for Safidy": rng.integers(1, 10, rows),
+    }))
+
+
+def chw(rows, seed=0, indicators=20):
+    # CHW activity sheet: one row per indicator and one column per period. Cleaning turns periods into
+    # rows, so `rows` counts indicator values (indicators x periods) and sizes grow the periods.
+    rng = np.random.default_rng(seed)
+    periods = max(rows // indicators, 1)
+    labels = [f"{2000 + i // 4}-Q{i % 4 + 1}" for i in range(periods)]
+    sites = site_names(2, seed)
+    header = ["Indicator", "Unnamed: 1", "Unnamed: 2", "Unnamed: 3", "Unnamed: 4"] + [f"Col{i}" for i in range(periods)]
+    values = rng.integers(0, 50, (indicators, periods)).astype(str)
+    body = pd.DataFrame(np.column_stack([
+        np.char.add("Home visits ", np.arange(indicators).astype(str)),
+        np.full(indicators, "n"), np.full(indicators, ""), np.full(indicators, ""), np.full(indicators, "10"),
+        values,
+    ]), columns=header)
+    top = pd.DataFrame([["Period", "unit", "", "", "target"] + labels,
+                        ["Indicators of realisation", "", "", "", ""] + [sites[i % 2] for i in range(periods)]],
+                       columns=header)
+    return _to_csv(pd.concat([top, body], ignore_index=True))
+
+
+GENERATORS = {
+    "iptt": iptt,
+    "larc": larc,
+    "cyp_csb": cyp_csb,
+    "impact": impact,
+    "outcomes": outcomes,
+    "chw": chw,
+}
@@ -0,0 +1,21 @@
+# Static CHW activity charts, drawn on a Figure given by render_pool rather than on pyplot's global state
+
+
+def draw_trend(fig, years, values, column):
+    ax = fig.subplots()
+    ax.plot(years, values, marker='o', linestyle='-', label=column)
+    ax.set_title(f'Trend of {column} Over Time')
+    ax.set_xlabel('Year')
+    ax.set_ylabel(column)
+    ax.legend()
+    ax.grid(True)
+
+
+def draw_indicator_sum(fig, df_indicator_sum):
+    ax = fig.subplots()
+    df_indicator_sum.plot(kind='bar', ax=ax)
+    ax.set_title('Sum of Selected Data Columns by Indicator')
+    ax.set_xlabel("Indicator of Realisation")
+    ax.set_ylabel("Sum")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
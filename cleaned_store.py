@@ -0,0 +1,268 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Cleaned uploads are kept here as hive-partitioned Parquet, one directory per cache key
+STORE_DIR = os.environ.get("BV_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bv_dashboard", "store"))
+# Disk budget for datasets saved as a cache (bytes); least recently used ones are removed past it.
+# Other datasets, such as the incremental histories, are never removed.
+MAX_STORE_BYTES = int(os.environ.get("BV_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Original row position, so rows come back in upload order whatever the partitioning
+ROW_COLUMN = "__row__"
+METADATA_FILE = "_common_metadata"
+METADATA_KEY = b"bv_dashboard"
+# Marks a dataset that can be evicted; its modification time is the dataset's last use
+CACHED_FILE = "_cached"
+# Small derived tables kept next to a dataset (e.g. per-year aggregates); the leading underscore keeps
+# them out of the dataset's own files
+SIDECAR_DIR = "_sidecar"
+
+# Appends to the same dataset are applied one at a time
+_lock = threading.Lock()
+_dataset_locks = {}
+
+
+def _dataset_dir(key):
+    return os.path.join(STORE_DIR, key)
+
+
+def has_cleaned(key):
+    return os.path.exists(os.path.join(_dataset_dir(key), METADATA_FILE))
+
+
+def dataset_lock(key):
+    # Held while a dataset is appended to or rewritten; reentrant, so callers can hold it around
+    # several store calls that must not interleave with another session's
+    with _lock:
+        return _dataset_locks.setdefault(key, threading.RLock())
+
+
+def _plain_type(arrow_type):
+    return arrow_type.value_type if pa.types.is_dictionary(arrow_type) else arrow_type
+
+
+def save_cleaned(key, df, partition_cols=(), version=None, replace=False, cached=False):
+    # Write a cleaned DataFrame to the store. Returns False when its columns cannot be stored
+    # as Parquet (e.g. mixed text and numbers), in which case callers keep using the DataFrame.
+    # version records the cleaner that produced the rows; replace overwrites a stored dataset;
+    # cached datasets count towards MAX_STORE_BYTES and may be removed to stay within it.
+    path = _dataset_dir(key)
+    if has_cleaned(key) and not replace:
+        return True
+    partition_cols = [col for col in partition_cols if col in df.columns]
+    try:
+        table = pa.Table.from_pandas(df.assign(**{ROW_COLUMN: np.arange(len(df))}), preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return False
+    table = table.replace_schema_metadata(None)
+    # partition values are stored in directory names, so they are written with their plain type
+    table = table.cast(pa.schema([pa.field(f.name, _plain_type(f.type)) if f.name in partition_cols else f
+                                  for f in table.schema]))
+
+    # categorical columns are restored on load from the categories recorded here
+    categories = {col: {"categories": df[col].cat.categories.tolist(), "ordered": bool(df[col].cat.ordered)}
+                  for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    metadata = {"partition_cols": partition_cols, "columns": list(df.columns), "categories": categories,
+                "version": version}
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        partitioning = None
+        if partition_cols:
+            partitioning = ds.partitioning(pa.schema([table.schema.field(col) for col in partition_cols]),
+                                           flavor="hive")
+        ds.write_dataset(table, tmp_path, format="parquet", partitioning=partitioning,
+                         existing_data_behavior="delete_matching")
+        _write_metadata(tmp_path, table.schema, metadata)
+        if cached:
+            open(os.path.join(tmp_path, CACHED_FILE), "wb").close()
+        os.makedirs(STORE_DIR, exist_ok=True)
+        if replace and os.path.exists(path):
+            old_path = f"{tmp_path}.old"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, path)
+    except OSError:
+        # another session stored the same upload first, or the store is not writable
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return has_cleaned(key)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+    if cached:
+        _prune_store()
+    return True
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _prune_store():
+    datasets = []
+    for entry in os.scandir(STORE_DIR):
+        try:
+            used = os.stat(os.path.join(entry.path, CACHED_FILE)).st_mtime
+        except OSError:
+            continue
+        datasets.append((used, _dir_bytes(entry.path), entry.path))
+    total = sum(size for _, size, _ in datasets)
+    for _, size, path in sorted(datasets):
+        if total <= MAX_STORE_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _write_metadata(path, schema, metadata):
+    schema = schema.with_metadata({METADATA_KEY: json.dumps(metadata, default=str).encode()})
+    pq.write_metadata(schema, os.path.join(path, METADATA_FILE))
+
+
+def _open(key):
+    path = _dataset_dir(key)
+    schema = pq.read_schema(os.path.join(path, METADATA_FILE))
+    metadata = json.loads(schema.metadata[METADATA_KEY])
+    partitioning = None
+    if metadata["partition_cols"]:
+        partitioning = ds.partitioning(pa.schema([schema.field(col) for col in metadata["partition_cols"]]),
+                                       flavor="hive")
+    return ds.dataset(path, schema=schema.remove_metadata(), format="parquet", partitioning=partitioning), metadata
+
+
+def stored_version(key):
+    # Cleaner version recorded with a stored dataset, None when absent or not recorded
+    if not has_cleaned(key):
+        return None
+    schema = pq.read_schema(os.path.join(_dataset_dir(key), METADATA_FILE))
+    return json.loads(schema.metadata[METADATA_KEY]).get("version")
+
+
+def load_cleaned(key):
+    # Read a stored dataset, or None if it is not in the store
+    if not has_cleaned(key):
+        return None
+    try:
+        dataset, metadata = _open(key)
+        table = dataset.to_table(columns=metadata["columns"] + [ROW_COLUMN])
+    except (OSError, pa.ArrowInvalid):
+        # evicted while being read
+        return None
+    try:
+        os.utime(os.path.join(_dataset_dir(key), CACHED_FILE))
+    except OSError:
+        pass
+    df = table.sort_by(ROW_COLUMN).drop_columns([ROW_COLUMN]).to_pandas()
+    return _restore_categories(df, metadata["categories"])
+
+
+def _restore_categories(df, categories):
+    for col, spec in categories.items():
+        if col in df.columns:
+            df[col] = df[col].astype(pd.CategoricalDtype(spec["categories"], ordered=spec["ordered"]))
+    return df
+
+
+def _merge_categories(spec, values):
+    known = set(spec["categories"])
+    added = [value for value in pd.unique(values.dropna()) if value not in known]
+    if not added:
+        return
+    merged = spec["categories"] + added
+    if spec["ordered"]:
+        try:
+            merged = sorted(merged)
+        except TypeError:
+            pass
+    spec["categories"] = merged
+
+
+def append_cleaned(key, df, partition_cols=(), replace_on=None, update=None, version=None):
+    # Merge new cleaned rows into a stored dataset, or store them when there is none yet. Only the
+    # partitions of the values of the first partition column (e.g. the years) found in the new rows are
+    # read and rewritten. Stored rows of those partitions whose replace_on values match a new row are
+    # replaced by it; update(frame) may recompute derived columns over the merged rows of the scope.
+    # Returns the merged rows of the scope, in row order. Raises ValueError when the new rows do not
+    # match the stored columns and types, or were cleaned by another version than the stored ones.
+    with dataset_lock(key):
+        if not has_cleaned(key):
+            frame = update(df) if update is not None else df
+            if not save_cleaned(key, frame, partition_cols, version):
+                raise ValueError("the new rows cannot be stored as Parquet")
+            return frame
+
+        path = _dataset_dir(key)
+        dataset, metadata = _open(key)
+        if metadata.get("version") != version:
+            raise ValueError(f"the stored rows were cleaned by version {metadata.get('version')} and the new "
+                             f"rows by version {version}; migrate the stored rows first")
+        columns = metadata["columns"]
+        missing, unexpected = set(columns) - set(df.columns), set(df.columns) - set(columns)
+        if missing or unexpected:
+            raise ValueError(f"columns do not match the stored dataset: missing {sorted(missing)}, "
+                             f"unexpected {sorted(unexpected)}")
+        partition_cols = metadata["partition_cols"]
+        for col, spec in metadata["categories"].items():
+            _merge_categories(spec, df[col].astype(object))
+
+        if partition_cols:
+            scope_values = pd.unique(df[partition_cols[0]].dropna()).tolist()
+            old = dataset.to_table(filter=ds.field(partition_cols[0]).isin(scope_values))
+        else:
+            old = dataset.to_table()
+        next_row = metadata.get("next_row")
+        if next_row is None:
+            rows = dataset.to_table(columns=[ROW_COLUMN])[ROW_COLUMN]
+            next_row = int(pc.max(rows).as_py()) + 1 if len(rows) else 0
+
+        old = _restore_categories(old.sort_by(ROW_COLUMN).to_pandas(), metadata["categories"])
+        new = _restore_categories(df[columns].assign(**{ROW_COLUMN: np.arange(next_row, next_row + len(df))}),
+                                  metadata["categories"])
+        if replace_on:
+            replaced = pd.MultiIndex.from_frame(old[replace_on]).isin(pd.MultiIndex.from_frame(new[replace_on]))
+            old = old[~replaced]
+        frame = pd.concat([old, new], ignore_index=True)
+        if update is not None:
+            frame = update(frame)
+
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=False).cast(dataset.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"the new rows do not match the stored types: {e}") from e
+        partitioning = None
+        if partition_cols:
+            partitioning = ds.partitioning(pa.schema([dataset.schema.field(col) for col in partition_cols]),
+                                           flavor="hive")
+        # every partition written is replaced as a whole and the others are left untouched; sessions
+        # reading the dataset meanwhile may briefly miss the partitions being replaced
+        ds.write_dataset(table, path, format="parquet", partitioning=partitioning,
+                         basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                         existing_data_behavior="delete_matching")
+        metadata["next_row"] = next_row + len(df)
+        _write_metadata(path, dataset.schema, metadata)
+        return frame.drop(columns=[ROW_COLUMN]).reset_index(drop=True)
+
+
+def save_sidecar(key, name, df):
+    path = os.path.join(_dataset_dir(key), SIDECAR_DIR)
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f".{name}.{threading.get_ident()}.tmp")
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, os.path.join(path, f"{name}.parquet"))
+
+
+def load_sidecar(key, name):
+    path = os.path.join(_dataset_dir(key), SIDECAR_DIR, f"{name}.parquet")
+    return pd.read_parquet(path) if os.path.exists(path) else None
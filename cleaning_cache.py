@@ -0,0 +1,208 @@
+import hashlib
+import io
+import logging
+import os
+import pickle
+import stat
+import threading
+from collections import OrderedDict
+
+# Memory budget for cleaned DataFrames kept in the process (bytes)
+MAX_MEMORY_BYTES = int(os.environ.get("BV_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Disk budget and location for DataFrames evicted from memory (bytes)
+MAX_DISK_BYTES = int(os.environ.get("BV_CACHE_MAX_DISK_BYTES", 2 * 1024 * 1024 * 1024))
+# Spilled frames are unpickled, so the directory is per user and only used while no one else can write to it
+SPILL_DIR = os.environ.get("BV_CACHE_DIR", os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "bv_dashboard", "spill"))
+# Uploads whose content hash is remembered; a digest is small, so a fixed number of them is kept
+MAX_DIGESTS = 10000
+
+# The cache is shared by every session and page of the running app
+_lock = threading.RLock()
+_entries = OrderedDict()  # key -> (DataFrame, size in bytes), least recently used first
+_memory_bytes = 0
+_key_locks = {}
+_digests = OrderedDict()  # uploaded file id -> SHA-256 of its bytes, least recently used first
+
+logger = logging.getLogger("bv.cleaning_cache")
+
+
+def _read_bytes(input_file):
+    if isinstance(input_file, (str, os.PathLike)):
+        with open(input_file, "rb") as f:
+            return f.read()
+    if hasattr(input_file, "getvalue"):
+        return input_file.getvalue()
+    input_file.seek(0)
+    return input_file.read()
+
+
+def _file_id(input_file):
+    # Streamlit keeps the same file_id for an upload across reruns; files on disk are identified by
+    # their path, size and modification time
+    if isinstance(input_file, (str, os.PathLike)):
+        stat = os.stat(input_file)
+        return (os.fspath(input_file), stat.st_size, stat.st_mtime_ns)
+    return getattr(input_file, "file_id", None)
+
+
+def file_digest(input_file):
+    # The hash of each file is only computed once
+    file_id = _file_id(input_file)
+    if file_id is not None:
+        with _lock:
+            digest = _digests.get(file_id)
+            if digest is not None:
+                _digests.move_to_end(file_id)
+                return digest
+    digest = hashlib.sha256(_read_bytes(input_file)).hexdigest()
+    if file_id is not None:
+        with _lock:
+            _digests[file_id] = digest
+            while len(_digests) > MAX_DIGESTS:
+                _digests.popitem(last=False)
+    return digest
+
+
+def cache_key(input_file, cleaner, version=1, name=None):
+    name = name or f"{cleaner.__module__}.{cleaner.__qualname__}"
+    return f"{name}-v{version}-{file_digest(input_file)}"
+
+
+def _spill_path(key):
+    return os.path.join(SPILL_DIR, hashlib.sha256(key.encode()).hexdigest() + ".pkl")
+
+
+def _private_spill_dir():
+    # True when SPILL_DIR exists, belongs to this user and cannot be written by anyone else; otherwise
+    # nothing is spilled to it or loaded from it
+    try:
+        os.makedirs(SPILL_DIR, mode=0o700, exist_ok=True)
+        info = os.stat(SPILL_DIR)
+    except OSError:
+        return False
+    if (hasattr(os, "getuid") and info.st_uid != os.getuid()) or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.warning("not spilling to %s: it must belong to this user and not be writable by others", SPILL_DIR)
+        return False
+    return True
+
+
+def _spill(key, df):
+    path = _spill_path(key)
+    if not _private_spill_dir() or os.path.exists(path):
+        return
+    try:
+        tmp_path = path + f".{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        _prune_spill_dir()
+    except OSError:
+        # Spilling is best effort; the entry is simply re-cleaned on its next use
+        pass
+
+
+def _prune_spill_dir():
+    files = []
+    for entry in os.scandir(SPILL_DIR):
+        if entry.name.endswith(".pkl"):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= MAX_DISK_BYTES:
+            break
+        os.remove(path)
+        total -= size
+
+
+def _load_spilled(key):
+    path = _spill_path(key)
+    if not os.path.exists(path) or not _private_spill_dir():
+        return None
+    try:
+        with open(path, "rb") as f:
+            df = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    os.utime(path)
+    return df
+
+
+def _insert(key, df):
+    global _memory_bytes
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    with _lock:
+        if key in _entries:
+            _memory_bytes -= _entries.pop(key)[1]
+        _entries[key] = (df, size)
+        _memory_bytes += size
+        evicted = []
+        while _memory_bytes > MAX_MEMORY_BYTES and len(_entries) > 1:
+            old_key, (old_df, old_size) = _entries.popitem(last=False)
+            _memory_bytes -= old_size
+            evicted.append((old_key, old_df))
+    for old_key, old_df in evicted:
+        _spill(old_key, old_df)
+
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry[0]
+    return None
+
+
+def get_built(key, build):
+    # Return the DataFrame cached under key, calling build() only on a miss. For results that are not
+    # the cleaning of one upload, e.g. a batch of uploads combined, keyed by their digests.
+    df = _lookup(key)
+    if df is not None:
+        return df
+
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    try:
+        with key_lock:
+            # another session may have built the same result while we waited
+            df = _lookup(key)
+            if df is None:
+                df = _load_spilled(key)
+            if df is None:
+                df = build()
+            _insert(key, df)
+    finally:
+        # also when build raised, so failed uploads do not leave their lock behind
+        with _lock:
+            _key_locks.pop(key, None)
+    return df
+
+
+def get_cleaned(input_file, cleaner, version=1, name=None, partition_cols=None):
+    # Return the cleaned DataFrame for an upload, running the cleaner only on a cache miss.
+    # The returned frame is shared between reruns and sessions, so callers must not modify it in place.
+    # With partition_cols the result is also kept in the Parquet store, so a re-upload of the same
+    # file after a restart is read back from there instead of being cleaned again.
+    key = cache_key(input_file, cleaner, version, name)
+
+    def clean():
+        # the Parquet store is only imported when a file is cleaned or read back
+        from cleaned_store import load_cleaned, save_cleaned
+        df = load_cleaned(key) if partition_cols is not None else None
+        if df is None:
+            df = cleaner(io.BytesIO(_read_bytes(input_file)))
+            if partition_cols is not None:
+                save_cleaned(key, df, partition_cols, cached=True)
+        return df
+
+    return get_built(key, clean)
+
+
+def clear_cache():
+    global _memory_bytes
+    with _lock:
+        _entries.clear()
+        _digests.clear()
+        _memory_bytes = 0
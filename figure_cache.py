@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+
+from timing import stage
+
+# Memory budget for built figures, kept as their serialized JSON (bytes)
+MAX_FIGURE_BYTES = int(os.environ.get("BV_FIGURE_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Figures are shared by every session as JSON text, which takes a fraction of the memory of a live
+# Figure; each hit gets its own Figure rebuilt from it
+_lock = threading.Lock()
+_figures = OrderedDict()  # key -> figure JSON, least recently used first
+_total_bytes = 0
+
+
+def cached_figure(key, build):
+    # The figure for a key, built by calling build() on a miss. The key must identify everything the
+    # figure is drawn from, typically the dataset's cache key, a chart name and the widget selection.
+    global _total_bytes
+    with _lock:
+        spec = _figures.get(key)
+        if spec is not None:
+            _figures.move_to_end(key)
+    if spec is not None:
+        # the JSON was made from a built figure, so it is not validated again
+        with stage("figure.load"):
+            return go.Figure(json.loads(spec), _validate=False)
+
+    with stage("figure.build"):
+        figure = build()
+    spec = pio.to_json(figure, validate=False)
+    with _lock:
+        if key in _figures:
+            _total_bytes -= len(_figures.pop(key))
+        _figures[key] = spec
+        _total_bytes += len(spec)
+        while _total_bytes > MAX_FIGURE_BYTES and len(_figures) > 1:
+            _total_bytes -= len(_figures.popitem(last=False)[1])
+    return figure
+
+
+def cached_plotly_chart(key, build, **kwargs):
+    # a cache hit skips building the figure (grouping and the plotly.express traces) and only
+    # rebuilds the Figure object from its JSON
+    figure = cached_figure(key, build)
+    with stage("figure.send"):
+        st.plotly_chart(figure, **kwargs)
+
+
+def clear_figures():
+    global _total_bytes
+    with _lock:
+        _figures.clear()
+        _total_bytes = 0
@@ -1,30 +1,26 @@
-import pandas as pd
-import numpy as np
+from schemas import read_csv
+from percent import parse_percent
+from timing import stage
 
-def ImpactFormat(file_path):
-    df = pd.read_csv(file_path)
+# Bump whenever the cleaned output changes so cached results are not reused
+CLEANER_VERSION = 5
 
-    def convert_percentage_to_number(x):
-        if isinstance(x, str) and "%" in x:
-            return float(x.replace("%", "")) / 100
-        return x
+HIV_PREVALENCE = "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"
+RETAINED_IN_CARE = "Proportion of women retained in care (HIV treatment)"
 
-    df["Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"] = df[
-        "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"
-    ].apply(convert_percentage_to_number)
 
-    def convert_number_to_percentage(x):
-        if pd.isna(x):
-            return x
-        elif isinstance(x, (int, float)) and "%" not in str(x):
-            return f"{float(x) * 100:.2f}%"
-        return x
+@stage("clean.impact")
+def ImpactFormat(file_path, output_file=None):
+    # blank rows left below the table in the spreadsheet
+    df = read_csv(file_path, "impact").dropna(how="all").reset_index(drop=True)
 
-    df["Proportion of women retained in care (HIV treatment)"] = df[
-        "Proportion of women retained in care (HIV treatment)"
-    ].apply(convert_number_to_percentage)
+    # Both columns mix "12.3%" texts with plain fractions; they are kept as numbers and only
+    # formatted as percentages when displayed. HIV prevalence stays a fraction (0.123) and
+    # retention in care is in percent (12.3).
+    df[HIV_PREVALENCE] = parse_percent(df[HIV_PREVALENCE], unit="fraction")
+    df[RETAINED_IN_CARE] = parse_percent(df[RETAINED_IN_CARE], unit="percent")
 
-    output_file = "cleaned_impact.csv"
-    df.to_csv(output_file, index=False)
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
 
-    return output_file
+    return df
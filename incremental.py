@@ -0,0 +1,99 @@
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+from aggregates import build_cube, update_cube
+from cleaned_store import (append_cleaned, dataset_lock, load_cleaned, load_sidecar, save_cleaned, save_sidecar,
+                           stored_version)
+from impact_cleaning import ImpactFormat, CLEANER_VERSION as IMPACT_VERSION
+from LARC_CHWs_Cleaning import larc_chw_cleaning, CLEANER_VERSION as LARC_VERSION
+from outcome_cleaning import OutcomesSave, CLEANER_VERSION as OUTCOMES_VERSION
+
+# A history kept in the store and grown one reporting period at a time, instead of re-uploading and
+# re-cleaning every past period:
+#   cleaner:        the page's cleaner, run on the new rows only
+#   partition_cols: store partitions; the first one (the year) is the scope an append rewrites
+#   replace_on:     columns identifying a row, so a period sent again replaces the stored one
+#   update:         recomputes columns derived over a whole year, given every row of the touched years
+#   migrations:     old cleaner version -> function turning stored rows of that version into rows of the
+#                   next one, applied to the whole history when the cleaner version is bumped
+Series = namedtuple("Series", ["cleaner", "version", "partition_cols", "replace_on", "update", "migrations"])
+
+
+SERIES = {
+    "larc": Series(larc_chw_cleaning, LARC_VERSION, ["Year", "Site"], ["Site", "Year", "Quarter"], None,
+                   # version 5 moved the sparse "Yearly total" column to LARC_CHWs_Cleaning.yearly_totals
+                   {4: lambda df: df.drop(columns=["Yearly total"])}),
+    "impact": Series(ImpactFormat, IMPACT_VERSION, ["Years", "Site"], ["Years", "Site"], None, {}),
+    "outcomes": Series(OutcomesSave, OUTCOMES_VERSION, ["Years", "Site"], ["Years", "Site"], None, {}),
+}
+
+# Name of the per-year cube kept next to each history
+CUBE_SIDECAR = "yearly"
+
+
+def series_key(name):
+    # The same for every cleaner version; the version the rows were cleaned by is kept in the store
+    return f"series-{name}"
+
+
+def _metrics(df, by):
+    return [col for col in df.columns if col != by and pd.api.types.is_numeric_dtype(df[col])
+            and not isinstance(df[col].dtype, pd.CategoricalDtype)]
+
+
+def migrate(name):
+    # Bring a history stored by an older cleaner up to the current version, rewriting it and its cube.
+    # Raises ValueError when no migration leads from the stored version to the current one.
+    series = SERIES[name]
+    key = series_key(name)
+    with dataset_lock(key):
+        version = stored_version(key)
+        if version is None or version == series.version:
+            return
+        frame = load_cleaned(key)
+        while version != series.version:
+            if version not in series.migrations:
+                raise ValueError(f"the {name} history was cleaned by version {version} and cannot be migrated "
+                                 f"to version {series.version}; re-append its files to a new store")
+            frame = series.migrations[version](frame)
+            version += 1
+        if not save_cleaned(key, frame, series.partition_cols, series.version, replace=True):
+            raise ValueError(f"the migrated {name} history cannot be stored as Parquet")
+        by = series.partition_cols[0]
+        save_sidecar(key, CUBE_SIDECAR, build_cube(frame, by, _metrics(frame, by)))
+
+
+def append(name, input_file):
+    # Clean a file holding only new rows and merge them into the history of `name`, rewriting just
+    # the years they fall in and updating those years of the per-year cube.
+    # Returns the number of new rows and the years touched.
+    series = SERIES[name]
+    key = series_key(name)
+    df = series.cleaner(input_file)
+    # the cube is updated under the same lock, so concurrent appends cannot overwrite each other's years
+    with dataset_lock(key):
+        migrate(name)
+        frame = append_cleaned(key, df, series.partition_cols, series.replace_on, series.update, series.version)
+
+        by = series.partition_cols[0]
+        cube = load_sidecar(key, CUBE_SIDECAR)
+        metrics = _metrics(frame, by)
+        cube = build_cube(frame, by, metrics) if cube is None else update_cube(cube, frame, by, metrics)
+        save_sidecar(key, CUBE_SIDECAR, cube)
+    return len(df), sorted(pd.unique(frame[by].dropna()).tolist())
+
+
+def yearly(name):
+    # count/sum/mean/min/max of each numeric column per year, as built by aggregates.build_cube
+    return load_sidecar(series_key(name), CUBE_SIDECAR)
+
+
+# python incremental.py <larc|impact|outcomes> new_rows.csv [...]
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in SERIES:
+        sys.exit(f"usage: python incremental.py <{'|'.join(SERIES)}> new_rows.csv [...]")
+    for path in sys.argv[2:]:
+        rows, years = append(sys.argv[1], path)
+        print(f"{path}: {rows} rows appended to {sys.argv[1]}, years {years}")
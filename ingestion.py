@@ -0,0 +1,65 @@
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Uploads are parsed and cleaned on a fixed number of threads shared by every session. pandas'
+# CSV parser releases the GIL while tokenizing, so files of one batch are read side by side.
+MAX_INGEST_WORKERS = int(os.environ.get("BV_INGEST_WORKERS", min(8, (os.cpu_count() or 1) + 4)))
+
+_pool = ThreadPoolExecutor(max_workers=MAX_INGEST_WORKERS, thread_name_prefix="bv-ingest")
+
+
+def clean_files(input_files, clean):
+    # clean(input_file) for every file, run concurrently; results come back in upload order.
+    # clean runs off the script thread, so it must not call Streamlit; its errors are raised here.
+    futures = [_pool.submit(clean, input_file) for input_file in input_files]
+    return [future.result() for future in futures]
+
+
+def iter_cleaned(input_files, clean):
+    # Like clean_files, but input_files may be a lazy iterator and results are yielded in order as they
+    # complete. At most MAX_INGEST_WORKERS files are read ahead, so a long batch is streamed through
+    # instead of being parsed all at once.
+    pending = deque()
+    for input_file in input_files:
+        pending.append(_pool.submit(clean, input_file))
+        if len(pending) >= MAX_INGEST_WORKERS:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def file_name(input_file):
+    return getattr(input_file, "name", input_file)
+
+
+def directory_files(path, extensions=(".csv", ".zip")):
+    # Data files directly inside a directory on the server, in name order
+    return sorted(entry.path for entry in os.scandir(path)
+                  if entry.is_file() and entry.name.lower().endswith(extensions))
+
+
+def _zip_member(archive, member, input_file):
+    member_file = io.BytesIO(archive.read(member))
+    member_file.name = f"{file_name(input_file)}/{member.filename}"
+    # members keep a stable id, so their content hash is computed once like any upload's
+    file_id = getattr(input_file, "file_id", None)
+    member_file.file_id = f"{file_id}/{member.filename}" if file_id is not None else None
+    return member_file
+
+
+def expand_uploads(input_files, extensions=(".csv",)):
+    # Uploads and server paths with every zip archive replaced by its data files. Members are only
+    # decompressed when the consumer reaches them.
+    for input_file in input_files:
+        if not str(file_name(input_file)).lower().endswith(".zip"):
+            yield input_file
+            continue
+        with zipfile.ZipFile(input_file) as archive:
+            for member in archive.infolist():
+                if (member.is_dir() or member.filename.startswith("__MACOSX/")
+                        or not member.filename.lower().endswith(extensions)):
+                    continue
+                yield _zip_member(archive, member, input_file)
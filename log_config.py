@@ -0,0 +1,92 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import threading
+
+# Application log: one JSON object per line, rolled over at BV_LOG_MAX_BYTES with BV_LOG_BACKUPS old files
+LOG_FILE = os.environ.get("BV_LOG_FILE", os.path.join(tempfile.gettempdir(), "bv_dashboard.log"))
+LOG_LEVEL = os.environ.get("BV_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.environ.get("BV_LOG_MAX_BYTES", 5 * 1024 * 1024))
+LOG_BACKUPS = int(os.environ.get("BV_LOG_BACKUPS", 3))
+# An identical message from the same logger is written once per this many seconds; the next one
+# written says how many were dropped in between
+DEDUP_SECONDS = float(os.environ.get("BV_LOG_DEDUP_SECONDS", 60))
+# Distinct messages remembered for deduplication before the memory is reset
+MAX_SEEN = 10000
+# Levels of chatty libraries, overridden with e.g. BV_LOG_LEVELS="matplotlib=INFO,bv.timing=WARNING"
+LOGGER_LEVELS = {"matplotlib": "WARNING", "PIL": "WARNING", "fontTools": "WARNING"}
+LOGGER_LEVELS.update(item.strip().split("=", 1) for item in os.environ.get("BV_LOG_LEVELS", "").split(",")
+                     if "=" in item)
+
+_lock = threading.Lock()
+_configured = False
+_listeners = []
+_seen = {}  # (logger, level, message) -> [time last written, number dropped since]
+
+
+def _dedup(record):
+    key = (record.name, record.levelno, record.getMessage())
+    with _lock:
+        entry = _seen.get(key)
+        if entry is not None and record.created - entry[0] < DEDUP_SECONDS:
+            entry[1] += 1
+            return False
+        if len(_seen) >= MAX_SEEN:
+            _seen.clear()
+        _seen[key] = [record.created, 0]
+    record.repeated = entry[1] if entry is not None else 0
+    return True
+
+
+def _structure(record):
+    # Runs on the listener thread, where the record's message (with any traceback) is already rendered
+    fields = {"time": record.created, "level": record.levelname, "logger": record.name,
+              "thread": record.threadName, "message": record.getMessage()}
+    if getattr(record, "repeated", 0):
+        fields["repeated"] = record.repeated
+    record.json = json.dumps(fields, default=str)
+    return True
+
+
+def queued_file_handler(path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, fmt="%(json)s"):
+    # A handler that only puts records on a queue; a background thread writes them to a rotating file,
+    # so logging never blocks a script run on disk I/O
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                        encoding="utf-8", delay=True)
+    if fmt == "%(json)s":
+        file_handler.addFilter(_structure)
+    file_handler.setFormatter(logging.Formatter(fmt))
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(stop)
+    _listeners.append(listener)
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(_dedup)
+    return handler
+
+
+def configure():
+    # Route the root logger to the application log; safe to call on every script run
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if LOG_FILE:
+        root.addHandler(queued_file_handler(LOG_FILE))
+    for name, level in LOGGER_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def stop():
+    # Flush and stop the writer threads, e.g. at interpreter exit
+    while _listeners:
+        _listeners.pop().stop()
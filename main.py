@@ -1,4 +1,10 @@
 import streamlit as st
+import log_config
+import memprofile
+from timing import stage
+import warmup
+
+log_config.configure()
 
 pages = {
         "📗 CHW Activity Dashboard": [
@@ -18,4 +24,12 @@ pages = {
 }
 
 pg = st.navigation(pages)
-pg.run()
\ No newline at end of file
+memprofile.begin(pg.title)
+try:
+    with stage(f"page.{pg.url_path or 'home'}"):
+        pg.run()
+finally:
+    memprofile.end()
+memprofile.panel()
+# chart libraries are imported in the background once the first page is on screen
+warmup.start()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import tracemalloc
+
+import streamlit as st
+
+# Opt-in allocation profiling of a page run, enabled for every session with BV_MEMPROFILE=1 or for one
+# browser tab with ?memprofile=1. Tracing slows every allocation, so it only runs while a profiled page
+# runs. It is process-wide: allocations of other sessions running at the same time are counted too.
+ENABLED = os.environ.get("BV_MEMPROFILE", "").lower() in ("1", "true", "yes")
+# Allocation sites listed per stage
+TOP_ALLOCATORS = int(os.environ.get("BV_MEMPROFILE_TOP", 10))
+# Frames of these files are not allocation sites worth listing
+_IGNORED = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+_lock = threading.Lock()
+_active_runs = 0
+
+_STATE = "_memprofile"
+
+
+def enabled():
+    return ENABLED or st.query_params.get("memprofile") in ("1", "true")
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, name) for name in _IGNORED])
+
+
+def begin(page):
+    # Start profiling this run of a page; a no-op unless profiling is enabled
+    global _active_runs
+    if not enabled():
+        st.session_state.pop(_STATE, None)
+        return
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active_runs += 1
+    tracemalloc.reset_peak()
+    st.session_state[_STATE] = {"page": page, "stages": [], "snapshot": _snapshot(), "running": True}
+
+
+def checkpoint(stage):
+    # Record what was allocated since the previous checkpoint (or the start of the run) under stage
+    run = st.session_state.get(_STATE)
+    if run is None or not run["running"]:
+        return
+    snapshot = _snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    diff = snapshot.compare_to(run["snapshot"], "lineno")
+    run["stages"].append({
+        "stage": stage,
+        "allocated_bytes": sum(stat.size_diff for stat in diff),
+        "peak_bytes": peak,
+        "top": [{"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_bytes": stat.size_diff, "count": stat.count_diff}
+                for stat in diff[:TOP_ALLOCATORS] if stat.size_diff > 0],
+    })
+    run["snapshot"] = snapshot
+    tracemalloc.reset_peak()
+
+
+def end():
+    # Close the run's last stage and stop tracing once no profiled run is left
+    global _active_runs
+    run = st.session_state.get(_STATE)
+    if run is None or not run["running"]:
+        return
+    checkpoint("render")
+    run["running"] = False
+    run.pop("snapshot", None)
+    with _lock:
+        _active_runs -= 1
+        if _active_runs == 0:
+            tracemalloc.stop()
+
+
+def report():
+    # The finished run as plain data, or None when it was not profiled
+    run = st.session_state.get(_STATE)
+    if run is None or run["running"]:
+        return None
+    return {"page": run["page"], "stages": run["stages"],
+            "peak_bytes": max((stage["peak_bytes"] for stage in run["stages"]), default=0)}
+
+
+def panel():
+    profile = report()
+    if profile is None:
+        return
+    with st.sidebar.expander("Memory profile", expanded=True):
+        st.write(f"Peak traced memory: {profile['peak_bytes'] / 1e6:.1f} MB")
+        st.dataframe([{"stage": stage["stage"], "allocated (MB)": stage["allocated_bytes"] / 1e6,
+                       "peak (MB)": stage["peak_bytes"] / 1e6} for stage in profile["stages"]],
+                     hide_index=True)
+        for stage in profile["stages"]:
+            st.caption(f"Top allocators: {stage['stage']}")
+            st.dataframe([{"where": top["where"], "MB": top["size_bytes"] / 1e6, "blocks": top["count"]}
+                          for top in stage["top"]], hide_index=True)
+        st.download_button("Download JSON", json.dumps(profile, indent=2),
+                           file_name="memory_profile.json", mime="application/json")
@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import plotly.graph_objects as go
+import streamlit as st
+from millify import millify
+
+from figure_cache import cached_plotly_chart
+
+# A metric card: `agg` of `metric` over the most recent selected year ("recent") or over every
+# selected year ("selected"), shown with its change against the previous year.
+#   fmt:   "percent" (12.34%), "millify" (1.2k) or "millify_percent" (1.2k% with a millified delta)
+#   chart: None, "pie" (value against 100%) or "gauge" (value within the selected min..max)
+# Labels may use {year} for the most recent year and {rounded} for the value rounded to an integer.
+CardSpec = namedtuple("CardSpec", ["label", "metric", "agg", "scope", "fmt", "delta_color", "chart", "chart_title",
+                                   "color"],
+                      defaults=["recent", "millify", "normal", None, None, None])
+
+CardResult = namedtuple("CardResult", ["spec", "value", "delta", "min", "max", "year"])
+
+# Evaluated cards are memoized per cube and selection
+MAX_SELECTIONS = 256
+
+_lock = threading.Lock()
+_results = OrderedDict()
+
+
+def recent_and_previous(selected_years, year_list):
+    # The most recent selected year, and the year its delta is taken against: the next older year in the
+    # data when one year is selected, otherwise the next older selected year
+    recent_year = max(selected_years)
+    if len(selected_years) == 1:
+        older = [year for year in year_list if year < recent_year]
+    else:
+        older = [year for year in selected_years if year < recent_year]
+    return recent_year, (max(older) if older else None)
+
+
+def _combine(cube, years):
+    # Stats of every metric over a set of years in one vectorized step
+    import numpy as np
+    import pandas as pd
+    cells = cube[cube.index.isin(years)]
+    sums = cells.xs("sum", axis=1, level=1).sum()
+    counts = cells.xs("count", axis=1, level=1).sum()
+    return pd.DataFrame({
+        "sum": sums,
+        "count": counts,
+        "mean": sums / counts.replace(0, np.nan),
+        "min": cells.xs("min", axis=1, level=1).min(),
+        "max": cells.xs("max", axis=1, level=1).max(),
+    })
+
+
+def evaluate_cards(cube, cards, selected_years, year_list):
+    # Values and deltas of every card for a selection, computed from three combined views of the cube
+    memo_key = (id(cube), tuple(selected_years), tuple(year_list), tuple(cards.items()))
+    with _lock:
+        memo = _results.get(memo_key)
+        if memo is not None and memo[0] is cube:
+            _results.move_to_end(memo_key)
+            return memo[1]
+
+    recent_year, previous_year = recent_and_previous(selected_years, year_list)
+    scopes = {"recent": _combine(cube, [recent_year]), "selected": _combine(cube, selected_years)}
+    previous = _combine(cube, [previous_year]) if previous_year is not None else None
+
+    results = {}
+    for name, spec in cards.items():
+        stats = scopes[spec.scope].loc[spec.metric]
+        value = stats[spec.agg]
+        delta = None
+        if previous is not None:
+            delta = value - previous.loc[spec.metric, spec.agg]
+        results[name] = CardResult(spec, value, delta, stats["min"], stats["max"], recent_year)
+
+    with _lock:
+        # the cube is kept with its results so a recycled id() can never return stale values
+        _results[memo_key] = (cube, results)
+        while len(_results) > MAX_SELECTIONS:
+            _results.popitem(last=False)
+    return results
+
+
+def _format(value, fmt, is_delta=False):
+    if value is None:
+        return None
+    if fmt == "percent":
+        return f"{value: .2f}%"
+    if fmt == "millify_percent" and not is_delta:
+        return millify(value, precision=2) + "%"
+    return millify(value, precision=2)
+
+
+def render_metric(result, label=None):
+    import pandas as pd
+    spec = result.spec
+    label = label or spec.label
+    rounded = millify(int(round(result.value)), precision=2) if pd.notna(result.value) else "-"
+    st.metric(label=label.format(year=result.year, rounded=rounded),
+              value=_format(result.value, spec.fmt),
+              delta=_format(result.delta, spec.fmt, is_delta=True),
+              delta_color=spec.delta_color)
+
+
+def _build_chart(result):
+    import plotly.express as px
+    spec = result.spec
+    if spec.chart == "pie":
+        return px.pie(values=[result.value, (100 - result.value)], names=["Prevalent", "Not Prevalent"],
+                      color_discrete_sequence=px.colors.sequential.dense)
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=result.value,
+        title={"text": spec.chart_title},
+        gauge={
+            "axis": {"range": [result.min, result.max]},
+            "bar": {"color": spec.color},
+            "steps": [
+                {"range": [result.min, result.value], "color": "#e6f5ff"},
+                {"range": [result.value, result.max], "color": "#cceeff"}
+            ]
+        },
+        number={"suffix": "%"}
+    ))
+    fig.update_layout(
+        width=250,  # Set width
+        height=250,  # Set height
+        margin=dict(l=20, r=20, t=50, b=50)
+    )
+    return fig
+
+
+def render_chart(result):
+    # a card's chart depends only on its spec and values, so the result itself is the figure key
+    if result.spec.chart in ("pie", "gauge"):
+        cached_plotly_chart(("card", result), lambda: _build_chart(result), use_container_width=True)
+
+
+def render_card(result):
+    render_metric(result)
+    render_chart(result)
@@ -1,9 +1,15 @@
-import pandas as pd
+from schemas import read_csv
+from timing import stage
 
+# Bump whenever the cleaned output changes so cached results are not reused
+CLEANER_VERSION = 4
 
-def OutcomesSave(file_path):
-    df = pd.read_csv(file_path)
-    output_file = "cleaned_output.csv"
-    df.to_csv(output_file, index=False)
 
-    return output_file
\ No newline at end of file
+@stage("clean.outcomes")
+def OutcomesSave(file_path, output_file=None):
+    # blank rows left below the table in the spreadsheet
+    df = read_csv(file_path, "outcomes").dropna(how="all").reset_index(drop=True)
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
+
+    return df
\ No newline at end of file
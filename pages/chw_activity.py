@@ -1,47 +1,167 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import logging
+import hashlib
+import math
+import os
+from cleaning_cache import file_digest, get_built
+from figure_cache import cached_plotly_chart
+from render_pool import render_pngs
+from chw_charts import draw_trend, draw_indicator_sum
+from ingestion import directory_files, expand_uploads, file_name, iter_cleaned
+import memprofile
+from timing import stage
 
 st.set_page_config(layout="wide")
 
-logging.basicConfig(filename='processing_log.txt',
-                    level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Optional directory of CHW activity sheets on the server, offered next to the uploader
+DATA_DIR = os.environ.get("BV_CHW_DATA_DIR")
+REQUIRED_COLUMNS = ["Year", "Indicators of realisation"]
+# Sheet columns holding units and targets rather than periods
+HELPER_COLUMNS = ['Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4']
+# Bumped whenever the cleaned output changes, so cached results of older cleaning are not reused
+CLEANER_VERSION = 2
 
-# data cleaning function
+logger = logging.getLogger("chw_activity")
+
+# data cleaning function: each sheet row (an indicator) becomes a column and each sheet column (a period) a row.
+# df is the sheet read as text; rows of its values are taken as the new columns, so no transposed frame is built.
 def process_and_save_data(df):
+    import numpy as np
+    import pandas as pd
     try:
-        # transpose dataframe
-        df_transposed = df.T
-        df_transposed = df_transposed.dropna(how='all')
+        values = df.to_numpy(dtype=object)
+
+        # keep the sheet columns that hold any value, except the unit and target columns
+        kept = np.flatnonzero(pd.notna(values).any(axis=0) & ~df.columns.isin(HELPER_COLUMNS))
 
-        # drop specific rows
-        df_transposed = df_transposed.drop(index=['Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4'],
-                                           errors='ignore')
+        # the first kept column holds the new column names, the others one row each
+        new_column_names = values[:, kept[0]].tolist()
+        block = values[:, kept[1:]]
 
-        # extract new column names
-        new_column_names = df_transposed.iloc[0].tolist()
+        # rows where every value is a number become float columns, the others stay text;
+        # the first row holds the periods, which are split into year and quarter below
+        columns = {0: block[0]}
+        for i in range(1, len(block)):
+            try:
+                columns[i] = block[i].astype(float)
+            except ValueError:
+                columns[i] = block[i]
 
-        # set new column names for transposed dataframe
-        df_transposed.columns = new_column_names
-        df_transposed = df_transposed.drop(index=df_transposed.index[0])
+        df_cleaned = pd.DataFrame(columns, index=df.columns[kept[1:]])
+        df_cleaned.columns = new_column_names
 
         # rename first column
-        df_transposed.rename(columns={df_transposed.columns[0]: 'Year'}, inplace=True)
+        df_cleaned.rename(columns={df_cleaned.columns[0]: 'Year'}, inplace=True)
 
         # reformat year column
-        df_transposed[['Year', 'Quarter']] = df_transposed['Year'].str.split('-', expand=True)
+        df_cleaned[['Year', 'Quarter']] = df_cleaned['Year'].str.split('-', expand=True)
 
-        return df_transposed
+        return df_cleaned
 
     except Exception as e:
-        logging.error(f"Error processing DataFrame: {e}")
+        logger.error("Error processing DataFrame: %s", e)
         return pd.DataFrame()  # return empty on error
 
 
+# load an uploaded sheet and clean it, used as the cached cleaner for each upload
+@stage("clean.chw")
+def load_and_clean(input_file):
+    import pandas as pd
+    return process_and_save_data(pd.read_csv(input_file, dtype=str))
+
+
+# runs on the ingestion pool for each sheet, uploaded or taken from a zip archive or the data directory
+def clean_sheet(input_file):
+    if hasattr(input_file, "seek"):
+        input_file.seek(0)
+    return file_name(input_file), load_and_clean(input_file)
+
+
+# pa.concat_tables, with columns holding numbers in one sheet and text in another kept as text
+def concat_tables(tables):
+    import pyarrow as pa
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        types = {}
+        for table in tables:
+            for field in table.schema:
+                types.setdefault(field.name, set()).add(field.type)
+        mixed = {name for name, found in types.items() if len(found - {pa.null()}) > 1}
+        tables = [table.cast(pa.schema([pa.field(field.name, pa.string()) if field.name in mixed else field
+                                        for field in table.schema])) for table in tables]
+        return pa.concat_tables(tables, promote_options="permissive")
+
+
+# clean every sheet of the batch and combine them. Each cleaned sheet is moved into a columnar buffer as it
+# arrives and dropped, so at most the sheets being read ahead are held next to the combined rows.
+# Errors about sheets left out are kept in the result's attrs.
+def combine_sheets(sources):
+    import pandas as pd
+    import pyarrow as pa
+    tables = []
+    errors = []
+    for name, cleaned_df in iter_cleaned(expand_uploads(sources), clean_sheet):
+        # validate required columns exist in the dataframe
+        if not all(col in cleaned_df.columns for col in REQUIRED_COLUMNS):
+            errors.append(f"The uploaded file {name} must contain the following columns: "
+                          f"{', '.join(REQUIRED_COLUMNS)}")
+        elif not (cleaned_df.columns.is_unique and all(isinstance(col, str) for col in cleaned_df.columns)):
+            errors.append(f"The uploaded file {name} has indicators without a name or with the same name")
+        else:
+            tables.append(pa.Table.from_pandas(cleaned_df, preserve_index=False))
+        del cleaned_df
+    if tables:
+        table = concat_tables(tables)
+        del tables
+        # the buffer is released column by column while the frame is built
+        combined_df = table.to_pandas(self_destruct=True, split_blocks=True)
+        del table
+    else:
+        combined_df = pd.DataFrame()
+    combined_df.attrs["errors"] = errors
+    return combined_df
+
+
+# Facets per row of the batched trend chart, and the height of each row in pixels
+FACET_COLUMNS = 3
+FACET_ROW_HEIGHT = 250
+
+
+# all selected columns in long format (Year, Indicators of realisation, Column, Value)
+def long_format(df_display, selected_columns):
+    return df_display.reset_index(drop=True).melt(id_vars=["Year", "Indicators of realisation"],
+                                                  value_vars=selected_columns, var_name="Column",
+                                                  value_name="Value")
+
+
+# one facet per selected column, drawn from a single long-format frame
+def trend_chart(df_long, column_count):
+    import plotly.express as px
+    rows = math.ceil(column_count / FACET_COLUMNS)
+    fig = px.line(df_long, x="Year", y="Value", facet_col="Column", facet_col_wrap=FACET_COLUMNS,
+                  facet_row_spacing=min(0.04, 0.3 / max(rows - 1, 1)), markers=True,
+                  title="Trend of Selected Data Columns Over Time")
+    # each facet keeps its own scale, like the separate per-column charts
+    fig.update_yaxes(matches=None, showticklabels=True, title_text="")
+    fig.for_each_annotation(lambda annotation: annotation.update(text=annotation.text.split("=", 1)[-1]))
+    fig.update_layout(height=FACET_ROW_HEIGHT * rows + 100)
+    return fig
+
+
+def indicator_chart(df_long):
+    import plotly.express as px
+    df_indicator_sum = df_long.groupby(["Indicators of realisation", "Column"], sort=True)["Value"].sum().reset_index()
+    fig = px.bar(df_indicator_sum, x="Indicators of realisation", y="Value", color="Column", barmode="group",
+                 labels={"Indicators of realisation": "Indicator of Realisation", "Value": "Sum"},
+                 title="Sum of Selected Data Columns by Indicator")
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
 # summary function
-def summary_page(df):
+def summary_page(df, data_key):
+    import pandas as pd
     st.title("CHW Activity Dashboard")
 
     # sidebar filters
@@ -58,6 +178,9 @@ def summary_page(df):
     all_columns = df.columns[2:]
     selected_columns = st.sidebar.multiselect('Select Data Columns', sorted(all_columns), default=sorted(all_columns))
 
+    # interactive charts send the data once for all columns; static images draw one PNG per column
+    chart_mode = st.sidebar.radio("Chart mode", ["Interactive", "Static images"])
+
     # filter data based on the selected years and indicators
     df_selected = df[df["Year"].isin(selected_years) & df["Indicators of realisation"].isin(selected_indicators)]
 
@@ -75,30 +198,32 @@ def summary_page(df):
         st.write("### Filtered Data")
         st.dataframe(df_display)
 
+        chart_key = (data_key, tuple(selected_years), tuple(selected_indicators), tuple(selected_columns))
+        if chart_mode == "Interactive":
+            df_long = long_format(df_display, selected_columns)
+
+            st.write("### Trend Over Time")
+            cached_plotly_chart(chart_key + ("trend",), lambda: trend_chart(df_long, len(selected_columns)),
+                                use_container_width=True)
+
+            st.write("### Indicator Comparison by Location")
+            cached_plotly_chart(chart_key + ("indicators",), lambda: indicator_chart(df_long),
+                                use_container_width=True)
+            return
+
         # line chart visualisation
         st.write("### Trend Over Time")
-        for column in selected_columns:
-            plt.figure(figsize=(10, 5))
-            plt.plot(df_display['Year'], df_display[column], marker='o', linestyle='-', label=column)
-            plt.title(f'Trend of {column} Over Time')
-            plt.xlabel('Year')
-            plt.ylabel(column)
-            plt.legend()
-            plt.grid(True)
-            st.pyplot(plt)
-            plt.clf()
+        trend_pngs = render_pngs(draw_trend, (10, 5),
+                                 [(df_display['Year'], df_display[column], column) for column in selected_columns])
+        for png in trend_pngs:
+            st.image(png, use_column_width=True, output_format="PNG")
 
         # bar chart visualisation
         st.write("### Indicator Comparison by Location")
         df_indicator_sum = df_display.groupby("Indicators of realisation")[selected_columns].sum()
 
-        df_indicator_sum.plot(kind='bar', figsize=(10, 6))
-        plt.title('Sum of Selected Data Columns by Indicator')
-        plt.xlabel("Indicator of Realisation")
-        plt.ylabel("Sum")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        st.pyplot(plt)
+        indicator_png, = render_pngs(draw_indicator_sum, (10, 6), [(df_indicator_sum,)])
+        st.image(indicator_png, use_column_width=True, output_format="PNG")
 
     else:
         st.write("No data available for the selected filters.")
@@ -106,36 +231,26 @@ def summary_page(df):
 
 # main dashboard function
 st.sidebar.title("CHW Activity Dashboard")
-st.sidebar.info("Upload up to 5 CSV files to start analyzing CHW activities.")
+st.sidebar.info("Upload CSV files, or ZIP archives of them, to start analyzing CHW activities.")
 
 # file uploader
-uploaded_files = []
-for i in range(5):
-    uploaded_file = st.sidebar.file_uploader(f"Upload CSV file {i + 1}", type="csv", key=f"file_uploader_{i}")
-    if uploaded_file:
-        uploaded_files.append(uploaded_file)
-
-if uploaded_files:
-    processed_dataframes = []
-    for uploaded_file in uploaded_files:
-        # load uploaded file into a dataframe
-        df = pd.read_csv(uploaded_file)
-
-        # clean dataframe
-        cleaned_df = process_and_save_data(df)
-
-        # validate required columns exist in the dataframe
-        required_columns = ["Year", "Indicators of realisation"]
-        if all(col in cleaned_df.columns for col in required_columns):
-            processed_dataframes.append(cleaned_df)
-        else:
-            st.error(
-                f"The uploaded file {uploaded_file.name} must contain the following columns: {', '.join(required_columns)}")
-
-    if processed_dataframes:
-        # combine all cleaned dataframes into a single one
-        combined_df = pd.concat(processed_dataframes, ignore_index=True)
-        summary_page(combined_df)
+sources = list(st.sidebar.file_uploader("Upload CSV or ZIP files", type=["csv", "zip"], accept_multiple_files=True,
+                                        key="file_uploader") or [])
+if DATA_DIR and os.path.isdir(DATA_DIR) and st.sidebar.checkbox(f"Include files from {DATA_DIR}"):
+    sources += directory_files(DATA_DIR)
+
+if sources:
+    # the combined batch is cached under the digests of the uploads, so reruns reuse it; sheets are
+    # cleaned a few at a time as they are reached and not cached one by one
+    batch = hashlib.sha256(" ".join(file_digest(source) for source in sources).encode()).hexdigest()
+    data_key = f"chw_activity.combine_sheets-v{CLEANER_VERSION}-{batch}"
+    combined_df = get_built(data_key, lambda: combine_sheets(sources))
+    for error in combined_df.attrs.get("errors", []):
+        st.error(error)
+
+    if not combined_df.empty:
+        memprofile.checkpoint("clean")
+        summary_page(combined_df, data_key)
     else:
         st.error("No valid data available after cleaning the uploaded files.")
 else:
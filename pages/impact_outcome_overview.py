@@ -1,74 +1,52 @@
 import streamlit as st
-import tracemalloc
 import datetime
-import tempfile
-import pandas as pd
+from cleaning_cache import get_cleaned
+import memprofile
 
 st.set_page_config(layout="wide")
 
 st.title("Outcome and Impact Data Overview")
-tracemalloc.start()
+
+
+def read_table(input_file):
+    # Any other sheet is shown as it is, without its empty rows
+    import pandas as pd
+    return pd.read_csv(input_file).dropna(how="all").reset_index(drop=True)
+
+
+def pick_cleaner(input_file):
+    # The impact and outcome sheets are cleaned by the same functions as their own pages, so an
+    # upload already opened there is served from the same cache entry instead of cleaned again
+    # (the cleaners, and pandas with them, are only imported once there is an upload)
+    import pandas as pd
+    import impact_cleaning
+    import outcome_cleaning
+    columns = pd.read_csv(input_file, nrows=0).columns
+    input_file.seek(0)
+    if "Population" in columns:
+        return impact_cleaning.ImpactFormat, impact_cleaning.CLEANER_VERSION, None
+    if "Couple Years Protection (CYP)AC" in columns:
+        return outcome_cleaning.OutcomesSave, outcome_cleaning.CLEANER_VERSION, None
+    return read_table, 1, "impact_outcome_overview.read_table"
+
+
+def show_table(df):
+    from impact_cleaning import RETAINED_IN_CARE
+    from schemas import SCHEMAS
+    # Percent columns are stored as numbers (12.3) and only shown with a percent sign
+    percent_columns = list(SCHEMAS["impact"].percent) + list(SCHEMAS["outcomes"].percent) + [RETAINED_IN_CARE]
+    st.dataframe(df, column_config={
+        name: st.column_config.NumberColumn(format="%.2f%%") for name in percent_columns if name in df.columns
+    })
+
 
 # upload a csv file
 uploaded_file = st.file_uploader("Please select a CSV file", type="csv")
 
 if uploaded_file is not None:
-    # use temp file to save the uploaded file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        tmp_file_path = tmp_file.name
-        st.write("File successfully uploaded and saved to:", tmp_file_path)
-
-    # @st.cache
-    @st.cache_data
-    # define a function to process the uploaded file and save the processed data
-    def process_and_save_data(input_file_path):
-        # load the .csv filedata
-        df = pd.read_csv(input_file_path)
-
-        # drop all rows with all NaN values
-        df_cleared = df.dropna(how="all")
-
-        df_cleared.reset_index(drop=True, inplace=True)
-        df_cleared.index += 0
-
-        # Convert percentage to number in the specified column if it exists
-        if (
-            "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"
-            in df_cleared.columns
-        ):
-            df_cleared[
-                "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"
-            ] = df_cleared[
-                "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only"
-            ].apply(
-                lambda x: (
-                    int(float(str(x).replace("%", "")) / 100)
-                    if "%" in str(x)
-                    else x
-                )
-            )
-
-        # Convert number to percentage in the specified column if it exists
-        if (
-            "Proportion of women retained in care (HIV treatment)"
-            in df_cleared.columns
-        ):
-            df_cleared[
-                "Proportion of women retained in care (HIV treatment)"
-            ] = df_cleared[
-                "Proportion of women retained in care (HIV treatment)"
-            ].apply(
-                lambda x: (
-                    f"{float(x) * 100:.2f}%"
-                    if pd.notna(x) and "%" not in str(x)
-                    else x
-                )
-            )
-        return df_cleared
-
-    # invoking the function to process the data
-    data = process_and_save_data(tmp_file_path)
+    cleaner, version, cleaner_name = pick_cleaner(uploaded_file)
+    data = get_cleaned(uploaded_file, cleaner, version, name=cleaner_name, partition_cols=["Years", "Site"])
+    memprofile.checkpoint("clean")
 
     # filter the data by year, quarter, and indicators of realisation
     data_column_option = st.sidebar.multiselect(
@@ -89,7 +67,7 @@ if uploaded_file is not None:
     # show the filtered data
     if data_column_option:
         table_to_display = ["Years", "Site"] + data_column_option
-        st.write(filtered_data[table_to_display])
+        show_table(filtered_data[table_to_display])
 
     if "Couple Years Protection (CYP)AC" in data.columns:
         # Get the current year
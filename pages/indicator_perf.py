@@ -1,11 +1,49 @@
 import streamlit as st
-import pandas as pd
-from DataCleaning import data_cleaning
-import plotly.express as px
+from cleaning_cache import file_digest, get_cleaned
+from figure_cache import cached_plotly_chart
+from ingestion import clean_files
+import memprofile
 
 st.set_page_config(layout="wide")
 
-def visualise(data):
+def performance_bar(long_data):
+    import plotly.express as px
+    color_map = {'Actual': 'darkblue', 'Target': 'blueviolet', 'Overall Target': 'cornflowerblue'}
+    fig_bar = px.bar(long_data, x='Year', y='Value', color='Type', color_discrete_map=color_map,
+                     labels={'Value': 'Value', 'Year': 'Year'},
+                     title="Indicator Performance Over Time (Bar Chart)")
+    fig_bar.update_layout(barmode='group', legend_title='Performance Type')
+    return fig_bar
+
+
+def actual_line(filtered_data, target_value, baseline_value):
+    import plotly.express as px
+    fig_line = px.line(filtered_data, x='Year', y='Actual',
+                       labels={'Actual': 'Actual Value', 'Year': 'Year'},
+                       title='Actual Performance Over Time')
+    fig_line.update_traces(mode='lines+markers', line=dict(color='darkblue', width=2),
+                           marker=dict(size=8))
+    fig_line.add_shape(type='line', x0=filtered_data['Year'].min(), x1=filtered_data['Year'].max(),
+                       y0=target_value, y1=target_value, line=dict(color='cornflowerblue', width=2, dash='dash'))
+    fig_line.add_shape(type='line', x0=filtered_data['Year'].min(), x1=filtered_data['Year'].max(),
+                       y0=baseline_value, y1=baseline_value, line=dict(color='green', width=2, dash='dot'))
+    fig_line.add_annotation(x=filtered_data['Year'].max(), y=target_value, text='Overall Target',
+                            showarrow=False, yshift=10, font=dict(color='cornflowerblue', size=12))
+    fig_line.add_annotation(x=filtered_data['Year'].max(), y=baseline_value, text='Baseline Value',
+                            showarrow=False, yshift=10, font=dict(color='green', size=12))
+    return fig_line
+
+
+def values_box(long_data):
+    import plotly.express as px
+    fig_box = px.box(long_data, x='Type', y='Value', color='Type', title="Distribution of Performance Values",
+                     labels={'Value': 'Value', 'Type': 'Performance Type'})
+    fig_box.update_traces(marker=dict(size=10))
+    return fig_box
+
+
+# data_key identifies the uploaded files, so figures are only rebuilt when the files or the indicator change
+def visualise(data, data_key):
     st.sidebar.title("Visualization Options")
     option = st.sidebar.selectbox("Select Indicator level", ["Impacts", "Outcomes"])
 
@@ -20,38 +58,18 @@ def visualise(data):
             target_value = filtered_data["Overall Target"].iloc[0]
             baseline_value = filtered_data["Baseline Value"].iloc[0]
 
-            # Bar Chart
             long_data = filtered_data.melt(id_vars='Year', value_vars=['Actual', 'Target', 'Overall Target'],
                                            var_name='Type', value_name='Value')
+            chart_key = (data_key, option, selected_category)
 
-            color_map = {'Actual': 'darkblue', 'Target': 'blueviolet', 'Overall Target': 'cornflowerblue'}
-            fig_bar = px.bar(long_data, x='Year', y='Value', color='Type', color_discrete_map=color_map,
-                             labels={'Value': 'Value', 'Year': 'Year'},
-                             title="Indicator Performance Over Time (Bar Chart)")
-            fig_bar.update_layout(barmode='group', legend_title='Performance Type')
-            st.plotly_chart(fig_bar)
+            # Bar Chart
+            cached_plotly_chart(chart_key + ("bar",), lambda: performance_bar(long_data))
 
             # Line Chart
-            fig_line = px.line(filtered_data, x='Year', y='Actual',
-                               labels={'Actual': 'Actual Value', 'Year': 'Year'},
-                               title='Actual Performance Over Time')
-            fig_line.update_traces(mode='lines+markers', line=dict(color='darkblue', width=2),
-                                   marker=dict(size=8))
-            fig_line.add_shape(type='line', x0=filtered_data['Year'].min(), x1=filtered_data['Year'].max(),
-                               y0=target_value, y1=target_value, line=dict(color='cornflowerblue', width=2, dash='dash'))
-            fig_line.add_shape(type='line', x0=filtered_data['Year'].min(), x1=filtered_data['Year'].max(),
-                               y0=baseline_value, y1=baseline_value, line=dict(color='green', width=2, dash='dot'))
-            fig_line.add_annotation(x=filtered_data['Year'].max(), y=target_value, text='Overall Target',
-                                    showarrow=False, yshift=10, font=dict(color='cornflowerblue', size=12))
-            fig_line.add_annotation(x=filtered_data['Year'].max(), y=baseline_value, text='Baseline Value',
-                                    showarrow=False, yshift=10, font=dict(color='green', size=12))
-            st.plotly_chart(fig_line)
+            cached_plotly_chart(chart_key + ("line",), lambda: actual_line(filtered_data, target_value, baseline_value))
 
             #Box Plot (Distribution of Values)
-            fig_box = px.box(long_data, x='Type', y='Value', color='Type', title="Distribution of Performance Values",
-                             labels={'Value': 'Value', 'Type': 'Performance Type'})
-            fig_box.update_traces(marker=dict(size=10))
-            st.plotly_chart(fig_box)
+            cached_plotly_chart(chart_key + ("box",), lambda: values_box(long_data))
 
         else:
             st.write("No data available for the selected indicator.")
@@ -61,16 +79,20 @@ def visualise(data):
 
 st.title("Indicator Performance Dashboard")
 uploaded_files = st.file_uploader("Upload CSV files", accept_multiple_files=True)
-combined_data = pd.DataFrame()
 
 if uploaded_files:
-    for uploaded_file in uploaded_files:
-        data = data_cleaning(uploaded_file)
-        if not data.empty:
-            combined_data = pd.concat([combined_data, data], ignore_index=True)
+    # the cleaner, and pandas with it, are only imported once there is an upload
+    import pandas as pd
+    from DataCleaning import data_cleaning, CLEANER_VERSION
+    # files are cleaned concurrently and combined with a single concat
+    cleaned = clean_files(uploaded_files,
+                          lambda uploaded_file: get_cleaned(uploaded_file, data_cleaning, CLEANER_VERSION))
+    cleaned = [data for data in cleaned if not data.empty]
+    combined_data = pd.concat(cleaned, ignore_index=True) if cleaned else pd.DataFrame()
+    memprofile.checkpoint("clean")
 
     if not combined_data.empty:
-        visualise(combined_data)
+        visualise(combined_data, tuple(file_digest(uploaded_file) for uploaded_file in uploaded_files))
     else:
         st.write("No data available for visualization.")
 else:
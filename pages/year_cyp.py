@@ -1,10 +1,28 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from LARC_CHWs_Cleaning import larc_chw_cleaning
+from cleaning_cache import cache_key, get_cleaned
+from figure_cache import cached_plotly_chart
+import memprofile
 
 st.set_page_config(layout="wide")
 
+
+# Bar graph showing all trends for the selected years and methods
+def methods_bar(df_selected_years, selected_method_list):
+    import plotly.express as px
+    # Aggregate data
+    df_aggregated = df_selected_years.groupby('Year', observed=True)[selected_method_list].sum().reset_index()
+    df_aggregated.sort_values(by="Year", inplace=True)
+
+    fig = px.bar(df_aggregated, x="Year", y=selected_method_list,
+                 labels={"value": "Total", "variable": "Method"},
+                 barmode="group",
+                 color_discrete_sequence=["#050C9C", "#3572EF", "#3ABEF9", "#A7E6FF"])
+
+    # Ensure the hover template shows the correct totals
+    fig.update_traces(hovertemplate='%{y:.2f}')
+    return fig
+
+
 # Creating a container for the title of the dashboard
 cont1 = st.container()
 with cont1:
@@ -15,10 +33,11 @@ with cont1:
 df_file = st.file_uploader("Choose a file", type=["csv"])
 
 if df_file is not None:
-    cleaned_csv_path = larc_chw_cleaning(df_file)
-
-    # Read the cleaned DataFrame (optional, just for display)
-    dataframe = pd.read_csv(cleaned_csv_path)
+    # the cleaner, and pandas with it, are only imported once there is an upload
+    from LARC_CHWs_Cleaning import larc_chw_cleaning, CLEANER_VERSION
+    # Cleaned once per upload and served from the cache on every rerun
+    dataframe = get_cleaned(df_file, larc_chw_cleaning, CLEANER_VERSION, partition_cols=["Year", "Site"])
+    memprofile.checkpoint("clean")
 
     # Include options to choose years on sidebar
     with st.sidebar:
@@ -31,20 +50,10 @@ if df_file is not None:
         method_list = ["CYP pills", "CYP injection", "CYP Implant", "CYP IUD"]
         selected_method_list = st.multiselect('Select methods', method_list, default=method_list)
 
-        # Aggregate data
-        df_aggregated = df_selected_years.groupby('Year')[selected_method_list].sum().reset_index()
-        df_aggregated.sort_values(by="Year", inplace=True)
-
-        # Create bar graph showing all trends for the selected years and methods
-    fig = px.bar(df_aggregated, x="Year", y=selected_method_list,
-                 labels={"value": "Total", "variable": "Method"},
-                 barmode="group",
-                 color_discrete_sequence=["#050C9C", "#3572EF", "#3ABEF9", "#A7E6FF"])
-
-    # Ensure the hover template shows the correct totals
-    fig.update_traces(hovertemplate='%{y:.2f}')
-
-    st.plotly_chart(fig)
+    # Rebuilt only when the upload, years or methods change
+    cached_plotly_chart((cache_key(df_file, larc_chw_cleaning, CLEANER_VERSION), "methods_bar", tuple(selected_years),
+                         tuple(selected_method_list)),
+                        lambda: methods_bar(df_selected_years, selected_method_list))
 
     #Create columns for metrics cards to me aligned
     col1, col2, col3, col4 = st.columns(4)
@@ -0,0 +1,14 @@
+import pandas as pd
+
+
+def parse_percent(values, unit="percent"):
+    # Vectorized parse of a column mixing text like "12.5%" and plain numbers. Values with a percent
+    # sign are in percent, plain numbers are fractions (0.125); the result is a float Series in `unit`,
+    # "percent" (12.5) or "fraction" (0.125). Anything that is not a number becomes NaN.
+    values = pd.Series(values)
+    text = values.astype("string")
+    has_sign = text.str.contains("%", regex=False).fillna(False).to_numpy(dtype=bool)
+    numbers = pd.to_numeric(text.str.replace("%", "", regex=False).str.strip(), errors="coerce").astype(float)
+    if unit == "percent":
+        return numbers.where(has_sign, numbers * 100)
+    return numbers.where(~has_sign, numbers / 100)
@@ -0,0 +1,54 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from timing import stage
+
+# Matplotlib figures are rendered by a fixed number of worker processes shared by every session
+MAX_RENDER_WORKERS = int(os.environ.get("BV_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+# Same output as st.pyplot
+PNG_OPTIONS = {"bbox_inches": "tight", "dpi": 200, "format": "png"}
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _render(draw, figsize, args):
+    # Each figure is created, drawn and saved in one call without touching pyplot's global state.
+    # matplotlib is only imported by the processes that draw.
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    draw(fig, *args)
+    image = io.BytesIO()
+    fig.savefig(image, **PNG_OPTIONS)
+    return image.getvalue()
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawned workers start from a clean interpreter instead of forking the server's threads
+            _pool = ProcessPoolExecutor(max_workers=MAX_RENDER_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+@stage("matplotlib.render")
+def render_pngs(draw, figsize, arg_lists):
+    # PNG bytes of draw(fig, *args) for each entry of arg_lists, in order. draw must be a module-level
+    # function and args picklable, as both are sent to the worker processes.
+    global _pool
+    pool = _get_pool()
+    try:
+        futures = [pool.submit(_render, draw, figsize, args) for args in arg_lists]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        # a worker died; start a new pool on the next call and render this batch here
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        return [_render(draw, figsize, args) for args in arg_lists]
@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# Declared layout of an uploaded CSV, so it is parsed once straight into its final types:
+#   columns:  column name -> "float", "int", "string" or "category"; undeclared columns are inferred
+#   percent:  columns written like "12.3%", read as floats in percent units (12.3)
+#   skiprows: title rows above the header
+#   header:   False when the sheet has no header row (columns are numbered)
+#   text:     read every cell as text, for sheets whose layout is only found after reading
+CsvSchema = namedtuple("CsvSchema", ["columns", "percent", "skiprows", "header", "text"],
+                       defaults=[(), 0, True, False])
+
+ARROW_TYPES = {
+    "float": pa.float64(),
+    "int": pa.int64(),
+    "string": pa.string(),
+    # long texts repeated on every row (sites, indicator names) are stored once per distinct value
+    "category": pa.dictionary(pa.int32(), pa.string()),
+}
+
+SCHEMAS = {
+    "iptt": CsvSchema({}, header=False, text=True),
+    "larc": CsvSchema({
+        "Site": "category",
+        "Quarter": "string",
+        "CYP pills": "float",
+        "CYP injection": "float",
+        "CYP Implant": "float",
+        "CYP IUD": "float",
+        "CYP total": "float",
+    }, skiprows=2),
+    "cyp_csb": CsvSchema({
+        "Date - Year": "float",
+        "CSB": "category",
+        "SUM of CYP_Oral": "float",
+        "SUM of CYP_Injection": "float",
+        "SUM of CYP_Implanon": "float",
+        "SUM of CYP_IUD": "float",
+        "SUM of CYP_Total": "float",
+    }, skiprows=2),
+    "impact": CsvSchema({
+        "Years": "int",
+        "Site": "category",
+        "Population": "int",
+        "Children under five": "int",
+        "Women of Reproductive Age (FAR) 15 - 49 years old": "int",
+        "Number of child deaths (absolute number)\nCHWs+CSB": "int",
+        # percentages and fractions mixed in one column, normalized by impact_cleaning
+        "Prevalence of HIV among children whose mothers are HIV+ve \nCSB only": "string",
+        "Proportion of women retained in care (HIV treatment)": "string",
+        "Number of Service Delivery points added/strengthened(Children under five and mother)": "int",
+    }, percent=(
+        "Child mortality rate (children under 5 years)\nCHWs+CSB",
+        "Proportion of women giving birth under a skilled attendant\nCSB only",
+    )),
+    "outcomes": CsvSchema({
+        "Years": "int",
+        "Site": "category",
+        "Couple Years Protection (CYP)AC": "float",
+        "Couple Years Protection (CYP)AC+LARC": "float",
+        "Couple Years Protection (CYP)CSB": "float",
+        "Number of Population reached with improved access to health services": "int",
+        "Number of Villages reached for Safidy": "int",
+    }, percent=(
+        "Proportion Neonatal Death ( 0-28 days) in local health system (CSB+Villages) level",
+        "Proportion of children under five years receiving appropriate treatment for diarrhea",
+        "Proportion of children under five years receiving appropriate treatment for malaria",
+        "Proportion of children under five years receiving appropriate treatment for pneumonia",
+    )),
+}
+
+
+def _read_arrow(input_file, schema):
+    column_types = {name: ARROW_TYPES[kind] for name, kind in schema.columns.items()}
+    column_types.update({name: pa.string() for name in schema.percent})
+    table = pacsv.read_csv(
+        input_file,
+        read_options=pacsv.ReadOptions(skip_rows=schema.skiprows, autogenerate_column_names=not schema.header),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    for name in schema.percent:
+        if name in table.column_names:
+            numbers = pc.utf8_trim_whitespace(pc.replace_substring(table[name], "%", ""))
+            table = table.set_column(table.column_names.index(name), name, pc.cast(numbers, pa.float64()))
+    return table.to_pandas()
+
+
+def _read_pandas(input_file, schema):
+    # The C engine with the same declared types; cells that are not numbers become NaN
+    dtype = {name: ("category" if kind == "category" else str)
+             for name, kind in schema.columns.items() if kind in ("string", "category")}
+    dtype.update({name: str for name in schema.percent})
+    df = pd.read_csv(input_file, skiprows=schema.skiprows, header=0 if schema.header else None, dtype=dtype)
+    for name, kind in schema.columns.items():
+        if kind in ("float", "int") and name in df.columns:
+            df[name] = pd.to_numeric(df[name], errors="coerce")
+    for name in schema.percent:
+        if name in df.columns:
+            df[name] = pd.to_numeric(df[name].str.replace("%", "", regex=False).str.strip(), errors="coerce")
+    return df
+
+
+def read_csv(input_file, schema):
+    # Parse a CSV with the pyarrow engine in its declared types, falling back to pandas' C engine for
+    # files pyarrow rejects (e.g. ragged rows or text in a numeric column)
+    if isinstance(schema, str):
+        schema = SCHEMAS[schema]
+    if schema.text:
+        # pyarrow has no advantage when every cell ends up a Python string
+        return pd.read_csv(input_file, skiprows=schema.skiprows, header=0 if schema.header else None, dtype=str)
+    try:
+        return _read_arrow(input_file, schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        if hasattr(input_file, "seek"):
+            input_file.seek(0)
+        return _read_pandas(input_file, schema)
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import plotly.express as px
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import figure_cache  # noqa: E402
+
+
+def setup_function():
+    figure_cache.clear_figures()
+
+
+def test_hit_returns_the_built_figure():
+    build = lambda: px.bar(x=[1, 2, 3], y=[3, 1, 2], title="bars")  # noqa: E731
+    built = figure_cache.cached_figure("bars", build)
+    hit = figure_cache.cached_figure("bars", build)
+    assert hit is not built
+    assert json.loads(pio.to_json(hit, validate=False)) == json.loads(pio.to_json(built, validate=False))
+
+
+def test_hit_is_not_validated():
+    # "bogus" is not a bar property, so rebuilding this spec with validation would raise
+    spec = '{"data": [{"type": "bar", "y": [1, 2], "bogus": 1}], "layout": {}}'
+    figure_cache._figures["invalid"] = spec
+    figure = figure_cache.cached_figure("invalid", lambda: None)
+    assert figure.data[0].type == "bar"
+
+
+def test_budget_counts_the_stored_json():
+    figure_cache.cached_figure("bars", lambda: px.bar(x=[1, 2], y=[2, 1]))
+    assert figure_cache._total_bytes == len(figure_cache._figures["bars"])
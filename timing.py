@@ -0,0 +1,86 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from prometheus_client import Histogram, start_http_server
+
+from log_config import queued_file_handler
+
+# Serve the stage histograms for Prometheus on this port (off when unset)
+METRICS_PORT = os.environ.get("BV_METRICS_PORT")
+# Recent durations kept per stage for the percentiles written to the timing log
+WINDOW = int(os.environ.get("BV_TIMING_WINDOW", 1000))
+# Seconds between two summaries in the timing log, which rolls over at 1 MB with 3 backups
+LOG_INTERVAL = float(os.environ.get("BV_TIMING_LOG_SECONDS", 60))
+LOG_FILE = os.environ.get("BV_TIMING_LOG", os.path.join(tempfile.gettempdir(), "bv_timing.log"))
+
+STAGE_SECONDS = Histogram(
+    "bv_stage_seconds", "Duration of a cleaning or rendering stage", ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+logger = logging.getLogger("bv.timing")
+
+_lock = threading.Lock()
+_recent = {}  # stage -> deque of its latest durations (seconds)
+_last_log = time.monotonic()
+_started = False
+
+
+def _start():
+    # The endpoint and the log handler are set up once per process, on the first timed stage
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+        if LOG_FILE and not logger.handlers:
+            logger.addHandler(queued_file_handler(LOG_FILE, 1024 * 1024, 3, "%(asctime)s %(message)s"))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        if METRICS_PORT:
+            try:
+                start_http_server(int(METRICS_PORT))
+            except OSError as e:
+                # e.g. another server process already exports on this port
+                logger.warning("metrics endpoint not started on port %s: %s", METRICS_PORT, e)
+
+
+def observe(name, seconds):
+    global _last_log
+    if not _started:
+        _start()
+    STAGE_SECONDS.labels(name).observe(seconds)
+    with _lock:
+        _recent.setdefault(name, deque(maxlen=WINDOW)).append(seconds)
+        due = time.monotonic() - _last_log >= LOG_INTERVAL
+        if due:
+            _last_log = time.monotonic()
+    if due:
+        for stage_name, stats in summary().items():
+            logger.info("%s n=%d p50=%.4fs p95=%.4fs max=%.4fs", stage_name,
+                        stats["count"], stats["p50"], stats["p95"], stats["max"])
+
+
+@contextmanager
+def stage(name):
+    # Time a block, or a whole function when used as a decorator: @stage("clean.impact")
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def summary():
+    # Percentiles of the recent durations of every stage (seconds)
+    import numpy as np
+    with _lock:
+        recent = {name: np.array(durations) for name, durations in _recent.items()}
+    return {name: {"count": len(durations), "p50": float(np.percentile(durations, 50)),
+                   "p95": float(np.percentile(durations, 95)), "max": float(durations.max())}
+            for name, durations in sorted(recent.items())}
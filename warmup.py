@@ -0,0 +1,72 @@
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from timing import observe
+
+# Modules only needed once there is an upload: pandas and pyarrow for cleaning, and the chart libraries
+# Streamlit does not load itself. Pages import them when they are used, and after the first page has
+# been shown a background thread imports them so the first upload or chart does not pay for it.
+HEAVY_MODULES = (
+    "pandas",
+    "pyarrow.dataset",
+    "schemas",
+    "cleaned_store",
+    "plotly.express",
+    "matplotlib.figure",
+    "streamlit_extras.metric_cards",
+)
+# BV_WARMUP=0 leaves every import to the first page that needs it
+WARMUP = os.environ.get("BV_WARMUP", "1") != "0"
+
+logger = logging.getLogger("bv.warmup")
+
+_lock = threading.Lock()
+_thread = None
+
+
+def _warm_up():
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("warm-up import of %s failed: %s", name, e)
+            continue
+        seconds = time.perf_counter() - start
+        observe(f"import.{name}", seconds)
+        logger.info("imported %s in %.3fs", name, seconds)
+
+
+def start():
+    # Start the warm-up once per process; later calls do nothing
+    global _thread
+    if not WARMUP:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_warm_up, name="bv-warmup", daemon=True)
+            _thread.start()
+
+
+# Import time of each module in a fresh interpreter where Streamlit is already loaded, as in a new
+# server: python warmup.py [module ...]
+if __name__ == "__main__":
+    modules = sys.argv[1:] or list(HEAVY_MODULES) + [
+        "prometheus_client", "cleaning_cache", "aggregates", "metric_cards", "figure_cache", "render_pool",
+        "ingestion", "memprofile", "timing",
+    ]
+    script = ("import sys, time; sys.path.insert(0, {repo!r}); import streamlit; start = time.perf_counter(); "
+              "import {module}; print(time.perf_counter() - start)")
+    repo = os.path.dirname(os.path.abspath(__file__))
+    timings = {}
+    for module in modules:
+        child = subprocess.run([sys.executable, "-c", script.format(repo=repo, module=module)],
+                               capture_output=True, text=True)
+        timings[module] = float(child.stdout.split()[-1]) if child.returncode == 0 else None
+    for module, seconds in sorted(timings.items(), key=lambda item: -(item[1] or 0)):
+        print(f"{module:<32} {'failed' if seconds is None else f'{seconds:.3f}s':>8}")